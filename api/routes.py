@@ -4,20 +4,17 @@ import json
 import pickle
 import uuid
 import pandas as pd
-import redis
 from fastapi import APIRouter, UploadFile, File, HTTPException
 
-from config.settings import STORAGE_RAW_DIR, STORAGE_PROCESSED_DIR, REDIS_URL
+from config.settings import STORAGE_RAW_DIR, STORAGE_PROCESSED_DIR
 from pipelines.ingest import save_raw_dataset
 from pipelines.preprocess import normalize_columns, detect_comment_column
+from intelligence.embeddings.ann import load_dataset_index
+from utils.redis_client import get_redis
 
 router = APIRouter()
 
 
-def get_redis():
-    return redis.Redis.from_url(REDIS_URL)
-
-
 def _serialize_result(payload):
     if isinstance(payload, pd.DataFrame):
         return payload.to_dict(orient="records")
@@ -45,11 +42,18 @@ def upload(file: UploadFile = File(...)):
 
 
 @router.post("/process")
-def process(dataset_id: str):
+def process(dataset_id: str, creator_id: str = None, video_id: str = None):
+    # With video_id set, the dataset is treated as new comments for that video
+    # and folded into its persisted clusters instead of refitting.
     job_id = str(uuid.uuid4())
     r = get_redis()
     r.set(f"job:{job_id}", json.dumps({"status": "queued", "progress": 0.0}))
-    r.rpush("job_queue", json.dumps({"job_id": job_id, "dataset_id": dataset_id}))
+    r.rpush("job_queue", json.dumps({
+        "job_id": job_id,
+        "dataset_id": dataset_id,
+        "creator_id": creator_id,
+        "video_id": video_id
+    }))
     return {"job_id": job_id}
 
 
@@ -62,18 +66,21 @@ def status(job_id: str):
     return json.loads(payload)
 
 
-@router.get("/results/{dataset_id}")
-def results(dataset_id: str):
+def _load_results(dataset_id):
     r = get_redis()
     cached = r.get(f"results:{dataset_id}")
     if cached:
-        data = pickle.loads(cached)
-    else:
-        path = os.path.join(STORAGE_PROCESSED_DIR, f"{dataset_id}.pkl")
-        if not os.path.exists(path):
-            raise HTTPException(status_code=404, detail="Results not found")
-        with open(path, "rb") as f:
-            data = pickle.load(f)
+        return pickle.loads(cached)
+    path = os.path.join(STORAGE_PROCESSED_DIR, f"{dataset_id}.pkl")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Results not found")
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+@router.get("/results/{dataset_id}")
+def results(dataset_id: str):
+    data = _load_results(dataset_id)
     return {"data": _serialize_result(data)}
 
 
@@ -105,3 +112,35 @@ def actions(dataset_id: str):
         data = pickle.loads(cached)
         return {"data": _serialize_result(data.get("top_insights", []))}
     raise HTTPException(status_code=404, detail="Actions not found")
+
+
+@router.get("/similar")
+def similar(dataset_id: str, row: int, k: int = 10):
+    index = load_dataset_index(dataset_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Similarity index not found")
+    if not 0 <= row < len(index):
+        raise HTTPException(status_code=400, detail=f"row must be in [0, {len(index)})")
+
+    clusters_df = _load_results(dataset_id)["clusters"]
+    rows, scores = index.similar(row, k=k)
+    matches = clusters_df.iloc[rows][["comment", "cluster"]].assign(row=rows, score=scores)
+    return {"data": _serialize_result(matches)}
+
+
+@router.get("/representatives")
+def representatives(dataset_id: str, cluster: int = None):
+    data = _load_results(dataset_id)
+    reps = data.get("representatives")
+    if reps is None:
+        raise HTTPException(status_code=404, detail="Representatives not found")
+    if cluster is not None:
+        if cluster not in reps:
+            raise HTTPException(status_code=404, detail="Cluster not found")
+        reps = {cluster: reps[cluster]}
+
+    comments = data["clusters"]["comment"]
+    return {"data": {
+        str(cluster_id): {kind: comments.iloc[rows].tolist() for kind, rows in kinds.items()}
+        for cluster_id, kinds in reps.items()
+    }}
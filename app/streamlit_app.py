@@ -6,7 +6,6 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 import random
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import MinMaxScaler
 
 ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
@@ -79,8 +78,7 @@ def run_full_pipeline(df):
     results = run_analysis(
         df_local,
         text_col="comment",
-        n_clusters=8,
-        batch_size=100
+        n_clusters=N_CLUSTERS
     )
 
     impact_scores = results.get("impact_scores", pd.DataFrame()).copy()
@@ -316,6 +314,7 @@ st.sidebar.write("Model: Semantic Clustering")
 st.sidebar.checkbox("Debug", value=False, key="debug")
 
 
+from config.settings import N_CLUSTERS
 from intelligence.pipeline import run_analysis
 
 
@@ -509,6 +508,8 @@ def render_upload_page():
                         st.write(f"Embedding time: {perf.get('embedding_time', 0):.2f}s")
                 if perf.get("clustering_time") is not None:
                     st.write(f"Clustering time: {perf.get('clustering_time', 0):.2f}s")
+                if perf.get("k_selection"):
+                    st.write(f"Clusters chosen: {perf['k_selection']['k']} (sweep {perf['k_selection']['seconds']:.2f}s)")
             except Exception as exc:
                 st.error(f"Processing failed: {exc}")
                 return
@@ -726,23 +727,24 @@ def render_strategic_insights():
             cluster_points = None
 
         with st.expander("Drivers", expanded=True):
-            if cluster_comments:
-                tfidf = TfidfVectorizer(max_features=10, stop_words="english")
-                tfidf_matrix = tfidf.fit_transform(cluster_comments)
-                scores = tfidf_matrix.mean(axis=0).A1
-                terms = tfidf.get_feature_names_out()
-                top_terms = sorted(zip(terms, scores), key=lambda x: x[1], reverse=True)
-                st.write([t for t, _ in top_terms])
+            # Precomputed per cluster (class-based TF-IDF) during the pipeline run.
+            drivers = analysis_results.get("keywords", {}).get(str(cluster_id), [])
+            if drivers:
+                st.write([k["keyword"] for k in drivers])
+            elif cluster_comments:
+                st.info("No keyword signals available for this cluster.")
             else:
                 st.info("No comments available for this cluster.")
 
         with st.expander("Evidence", expanded=True):
-            if cluster_points is not None and not cluster_points.empty:
-                centroid = cluster_points[["x", "y"]].mean().to_numpy()
-                distances = np.linalg.norm(cluster_points[["x", "y"]].to_numpy() - centroid, axis=1)
-                cluster_points = cluster_points.assign(distance=distances)
-                rep = cluster_points.sort_values("distance").head(5)
-                st.dataframe(rep[["comment", "likes", "sentiment"]], width="stretch")
+            representatives = analysis_results.get("representatives", {})
+            if cluster_points is not None and not cluster_points.empty and cluster_id in representatives:
+                # Precomputed in embedding space during the pipeline run.
+                central_tab, liked_tab, divergent_tab = st.tabs(["Most central", "Most liked", "Most divergent"])
+                for tab, kind in [(central_tab, "central"), (liked_tab, "most_liked"), (divergent_tab, "divergent")]:
+                    with tab:
+                        rep = embeddings_2d.iloc[representatives[cluster_id][kind]]
+                        st.dataframe(rep[["comment", "likes", "sentiment"]], width="stretch")
             else:
                 st.info("No embedding data available.")
 
@@ -831,7 +833,7 @@ def render_cluster_explorer():
     with middle_right:
         cluster_keywords = keywords.get(str(cluster), [])
         if cluster_keywords:
-            keyword_df = pd.DataFrame(cluster_keywords).sort_values(
+            keyword_df = pd.DataFrame(cluster_keywords[:5]).sort_values(
                 "importance",
                 ascending=True
             )
@@ -867,11 +869,26 @@ def render_cluster_explorer():
 
     with bottom_right:
         st.subheader("Representative Comments")
+        representatives = analysis_results.get("representatives", {})
+        rep_rows = next((reps["central"] for c, reps in representatives.items() if str(c) == cluster), None)
+        rep_df = cluster_df.iloc[rep_rows] if rep_rows else selected_df.head(10)
         st.dataframe(
-            selected_df[["comment", "likes", "sentiment"]].head(10),
+            rep_df[["comment", "likes", "sentiment"]],
             width="stretch"
         )
 
+    ann_index = analysis_results.get("ann_index")
+    if ann_index is not None and not selected_df.empty:
+        st.subheader("Similar Comments")
+        query_row = st.selectbox(
+            "Find comments similar to",
+            selected_df.index.tolist()[:200],
+            format_func=lambda i: cluster_df.at[i, "comment"]
+        )
+        rows, scores = ann_index.similar(cluster_df.index.get_loc(query_row), k=10)
+        similar_df = cluster_df.iloc[rows][["comment", "cluster", "likes"]].assign(similarity=scores)
+        st.dataframe(similar_df, width="stretch")
+
 
 def render_action_recommendations():
     st.markdown(
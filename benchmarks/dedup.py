@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from intelligence.embeddings.dedup import deduplicate, normalize_text
+from intelligence.embeddings.minhash import near_duplicate_groups
+
+# Whole deduplication stage (normalization, exact collapse, MinHash
+# near-duplicate grouping) in comments per second, best of --repeat runs.
+#
+#   python benchmarks/dedup.py
+#   python benchmarks/dedup.py --rows 118240 --unique
+
+
+def load_comments(args):
+    df = pd.read_csv(args.csv)
+    column = "comment" if "comment" in df.columns else "comment_text"
+    comments = df[column].astype(str)
+    if args.rows:
+        comments = pd.concat([comments] * (args.rows // len(comments) + 1), ignore_index=True)[:args.rows]
+    if args.unique:
+        # Every row distinct, so only the near-duplicate stage can fold them.
+        comments = comments + " #" + pd.Series(np.arange(len(comments))).astype(str)
+    return comments
+
+
+def best_of(fn, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    return result, min(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplication stage throughput")
+    parser.add_argument("--csv", default=os.path.join(ROOT_DIR, "synthetic_tiktok_comments_large.csv"))
+    parser.add_argument("--rows", type=int, default=118240, help="tile the CSV to N rows (0 keeps it as is)")
+    parser.add_argument("--unique", action="store_true", help="make every comment distinct")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    comments = load_comments(args)
+    (unique_texts, _, _), seconds = best_of(lambda: deduplicate(comments), args.repeat)
+    normalized = pd.unique(pd.Series([normalize_text(t) for t in comments], dtype="object"))
+    _, minhash_seconds = best_of(lambda: near_duplicate_groups(list(normalized)), args.repeat)
+
+    print(f"{len(comments)} comments, {len(normalized)} distinct after normalization, {len(unique_texts)} groups")
+    print(f"deduplicate:          {seconds:.2f}s ({len(comments) / seconds / 1000:.0f}k comments/s)")
+    print(f"near_duplicate_groups: {minhash_seconds:.2f}s of that")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import base64
+import resource
+import argparse
+import subprocess
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from intelligence.embeddings.cache import TieredEmbeddingCache
+from intelligence.embeddings.providers import OpenAIEmbeddingProvider
+from intelligence.embeddings.router import embed
+
+# Peak RSS of the embedding stage (parse responses, gather, 2-D projection)
+# before and after the float32-end-to-end change. No network: a fake client
+# serves base64 payloads the way the embeddings endpoint does, and each mode
+# runs in its own process so peaks don't leak between them.
+#
+#   python benchmarks/embedding_memory.py
+#   python benchmarks/embedding_memory.py --synthetic 500000 --dim 256
+
+
+class FakeEmbeddingsAPI:
+    def __init__(self, dim):
+        self.dim = dim
+
+    def create(self, model, input, encoding_format=None, **options):
+        rng = np.random.default_rng(len(input))
+        data = [
+            SimpleNamespace(embedding=base64.b64encode(rng.standard_normal(self.dim).astype("<f4").tobytes()).decode())
+            for _ in input
+        ]
+        if encoding_format != "base64":
+            # What the SDK does when no encoding_format is requested.
+            for item in data:
+                item.embedding = np.frombuffer(base64.b64decode(item.embedding), dtype="float32").tolist()
+        return SimpleNamespace(data=data)
+
+
+def load_texts(args):
+    if args.synthetic:
+        # A quarter repeats, like the bundled data's short reactions.
+        return [f"synthetic comment {i % (args.synthetic * 3 // 4)}" for i in range(args.synthetic)]
+    df = pd.read_csv(args.csv)
+    column = "comment" if "comment" in df.columns else "comment_text"
+    return df[column].astype(str).tolist()
+
+
+def run_lists(texts, api, batch_size):
+    # The previous path: float lists from the SDK, one float32 matrix per
+    # batch kept until the end, a full-size copy in the embedder, the router's
+    # own matrix, a gather by inverse and a list of row views for callers.
+    inverse, unique = pd.factorize(pd.Series(texts, dtype="object"), sort=False)
+    vectors = None
+    matrices = []
+    for start in range(0, len(unique), batch_size):
+        response = api.create(model="text-embedding-3-small", input=list(unique[start:start + batch_size]))
+        rows = list(np.array([e.embedding for e in response.data], dtype=np.float32))
+        matrix = np.zeros((len(rows), len(rows[0])), dtype=np.float32)
+        for j, v in enumerate(rows):
+            matrix[j] = v
+        matrices.append(matrix)
+        if vectors is None:
+            vectors = np.zeros((len(unique), matrix.shape[1]), dtype=np.float32)
+        vectors[start:start + len(matrix)] = matrix
+    embeddings = np.zeros_like(vectors)
+    for i, matrix in enumerate(matrices):
+        embeddings[i * batch_size:i * batch_size + len(matrix)] = matrix
+    del embeddings, matrices
+    embeddings = list(vectors[inverse])
+    return PCA(n_components=2).fit_transform(np.array(embeddings))
+
+
+def run_matrix(texts, api, batch_size):
+    provider = OpenAIEmbeddingProvider(client=SimpleNamespace(embeddings=api))
+    embeddings = embed(texts, batch_size=batch_size, provider=provider, cache=TieredEmbeddingCache([]))
+    # Same projection as pipeline._project_2d, which no longer copies.
+    return PCA(n_components=2).fit_transform(np.asarray(embeddings, dtype=np.float32))
+
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(args):
+    texts = load_texts(args)
+    baseline = peak_mb()
+    {"lists": run_lists, "matrix": run_matrix}[args.run](texts, FakeEmbeddingsAPI(args.dim), args.batch_size)
+    print(json.dumps({"mode": args.run, "rows": len(texts), "baseline_mb": baseline, "peak_mb": peak_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of the embedding stage: float lists vs float32 matrix")
+    parser.add_argument("--csv", default=os.path.join(ROOT_DIR, "synthetic_tiktok_comments_large.csv"))
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic comments instead of the CSV")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=2048)
+    parser.add_argument("--run", choices=["lists", "matrix"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        return run_mode(args)
+
+    rows = []
+    for mode in ("lists", "matrix"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run", mode] + sys.argv[1:],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        result["stage_mb"] = result["peak_mb"] - result["baseline_mb"]
+        rows.append(result)
+
+    print(f"{rows[0]['rows']} comments x {args.dim} dims")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+    print(f"peak RSS drop: {rows[0]['peak_mb'] - rows[1]['peak_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import re
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from intelligence.text_features import text_features, POS_WORDS, NEG_WORDS
+
+# Word counts and lexicon sentiment for every comment: the previous
+# per-row apply path against text_features, checked to agree exactly. Both
+# the tiled CSV (repetitive, like real uploads) and fully distinct rows are
+# timed. On one core at 1M rows the tiled case runs ~130x faster, but the
+# distinct case only ~4x (8.7s -> 2.1s): every distinct comment still costs
+# a few byte-level passes, and factorizing saves nothing there.
+#
+#   python benchmarks/text_features.py
+#   python benchmarks/text_features.py --rows 1000000 --unique
+
+
+def _compute_sentiment(text):
+    # The previous pipeline implementation, kept here as the reference.
+    tokens = re.findall(r"[a-zA-Z']+", str(text).lower())
+    if not tokens:
+        return 0.0
+    pos = sum(1 for t in tokens if t in POS_WORDS)
+    neg = sum(1 for t in tokens if t in NEG_WORDS)
+    if pos + neg == 0:
+        return 0.0
+    return (pos - neg) / (pos + neg)
+
+
+def _compute_engagement(text):
+    return float(len(str(text).split()))
+
+
+def load_comments(args, unique):
+    df = pd.read_csv(args.csv)
+    column = "comment" if "comment" in df.columns else "comment_text"
+    comments = df[column]
+    if args.rows:
+        comments = pd.concat([comments] * (args.rows // len(comments) + 1), ignore_index=True)[:args.rows]
+    if unique:
+        # Every row distinct, so deduplication saves nothing.
+        comments = comments.astype(str) + " #" + pd.Series(np.arange(len(comments))).astype(str)
+    return comments
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row apply vs vectorized word counts and sentiment")
+    parser.add_argument("--csv", default=os.path.join(ROOT_DIR, "synthetic_tiktok_comments_large.csv"))
+    parser.add_argument("--rows", type=int, default=1000000, help="tile the CSV to N rows (0 keeps it as is)")
+    parser.add_argument("--unique", action="store_true", help="only time the every-comment-distinct case")
+    args = parser.parse_args()
+
+    for unique in [True] if args.unique else [False, True]:
+        comments = load_comments(args, unique)
+        comment_series = comments.astype(str)
+        (old_likes, old_sentiment), old_seconds = timed(lambda: (
+            comment_series.apply(_compute_engagement).to_numpy(),
+            comment_series.apply(_compute_sentiment).to_numpy()
+        ))
+        (likes, sentiment), new_seconds = timed(lambda: text_features(comments, negation=False))
+
+        assert np.array_equal(likes, old_likes) and np.array_equal(sentiment, old_sentiment)
+        print(f"{len(comments)} comments, {comments.nunique()} distinct")
+        print(f"  apply:         {old_seconds:.2f}s")
+        print(f"  text_features: {new_seconds:.2f}s ({old_seconds / new_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,88 @@ BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 STORAGE_RAW_DIR = os.path.join(BASE_DIR, "storage", "raw")
 STORAGE_PROCESSED_DIR = os.path.join(BASE_DIR, "storage", "processed")
 STORAGE_CACHE_DIR = os.path.join(BASE_DIR, "storage", "cache")
+EMBEDDING_STORE_DIR = os.environ.get("EMBEDDING_STORE_DIR", os.path.join(STORAGE_CACHE_DIR, "embeddings"))
+INSIGHT_CACHE_DIR = os.environ.get("INSIGHT_CACHE_DIR", os.path.join(STORAGE_CACHE_DIR, "insights"))
+CLUSTER_STATE_DIR = os.environ.get("CLUSTER_STATE_DIR", os.path.join(STORAGE_CACHE_DIR, "clusters"))
+LOCAL_EMBEDDING_MODEL_PATH = os.environ.get("LOCAL_EMBEDDING_MODEL_PATH", os.path.join(STORAGE_CACHE_DIR, "local_embedder.pkl"))
 
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
 OPENAI_MODEL_EMBEDDINGS = os.environ.get("OPENAI_MODEL_EMBEDDINGS", "text-embedding-3-small")
+OPENAI_EMBEDDING_DIMENSIONS = int(os.environ.get("OPENAI_EMBEDDING_DIMENSIONS", "0"))
 OPENAI_MODEL_INSIGHTS = os.environ.get("OPENAI_MODEL_INSIGHTS", "gpt-4o-mini")
+INSIGHT_MAX_IN_FLIGHT = int(os.environ.get("INSIGHT_MAX_IN_FLIGHT", "6"))
+INSIGHT_TIMEOUT = float(os.environ.get("INSIGHT_TIMEOUT", "60"))
+INSIGHT_MAX_RETRIES = int(os.environ.get("INSIGHT_MAX_RETRIES", "2"))
+INSIGHT_RETRY_BACKOFF = float(os.environ.get("INSIGHT_RETRY_BACKOFF", "1.0"))
+# Up to INSIGHT_BATCH_CLUSTERS clusters share one request while their prompt
+# sections fit INSIGHT_BATCH_TOKENS; 1 asks for every cluster separately.
+INSIGHT_BATCH_CLUSTERS = int(os.environ.get("INSIGHT_BATCH_CLUSTERS", "4"))
+INSIGHT_BATCH_TOKENS = int(os.environ.get("INSIGHT_BATCH_TOKENS", "6000"))
+# Prompt sample per cluster: distinct comments up to INSIGHT_PROMPT_TOKENS,
+# each cut to INSIGHT_COMMENT_CHARS, far-out ones chosen by MMR over a pool.
+INSIGHT_PROMPT_TOKENS = int(os.environ.get("INSIGHT_PROMPT_TOKENS", "1500"))
+INSIGHT_COMMENT_CHARS = int(os.environ.get("INSIGHT_COMMENT_CHARS", "280"))
+INSIGHT_MMR_POOL = int(os.environ.get("INSIGHT_MMR_POOL", "2000"))
+INSIGHT_MMR_LAMBDA = float(os.environ.get("INSIGHT_MMR_LAMBDA", "0.5"))
+# Negated lexicon hits ("not good") flip polarity; 0 keeps the original scores.
+SENTIMENT_NEGATION = int(os.environ.get("SENTIMENT_NEGATION", "0"))
+# Insights are cached by a fingerprint of the cluster's comments: "disk", "redis" or "none".
+INSIGHT_CACHE = os.environ.get("INSIGHT_CACHE", "disk")
+INSIGHT_CACHE_TTL = int(os.environ.get("INSIGHT_CACHE_TTL", str(7 * 24 * 3600)))
 
-EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "200"))
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "openai")
+LOCAL_EMBEDDING_DIM = int(os.environ.get("LOCAL_EMBEDDING_DIM", "128"))
+LOCAL_EMBEDDING_FEATURES = int(os.environ.get("LOCAL_EMBEDDING_FEATURES", str(2 ** 16)))
+LOCAL_EMBEDDING_FIT_SAMPLE = int(os.environ.get("LOCAL_EMBEDDING_FIT_SAMPLE", "50000"))
+# No SVD projection is fitted on fewer documents than this; until then a fixed
+# random projection is used. A refit happens once the observed corpus has grown
+# LOCAL_EMBEDDING_REFIT_GROWTH-fold since the last fit.
+LOCAL_EMBEDDING_MIN_FIT_DOCS = int(os.environ.get("LOCAL_EMBEDDING_MIN_FIT_DOCS", "1000"))
+LOCAL_EMBEDDING_REFIT_GROWTH = float(os.environ.get("LOCAL_EMBEDDING_REFIT_GROWTH", "4"))
+
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "2048"))
+EMBEDDING_BATCH_TOKENS = int(os.environ.get("EMBEDDING_BATCH_TOKENS", "60000"))
+EMBEDDING_MAX_IN_FLIGHT = int(os.environ.get("EMBEDDING_MAX_IN_FLIGHT", "8"))
+EMBEDDING_MIN_IN_FLIGHT = int(os.environ.get("EMBEDDING_MIN_IN_FLIGHT", "1"))
+EMBEDDING_MAX_RETRIES = int(os.environ.get("EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_RETRY_BACKOFF = float(os.environ.get("EMBEDDING_RETRY_BACKOFF", "0.5"))
+# Extra provider calls one job may spend bisecting rejected batches; inputs
+# still unresolved after that are reported as rejected.
+EMBEDDING_MAX_SPLIT_CALLS = int(os.environ.get("EMBEDDING_MAX_SPLIT_CALLS", "256"))
 CLUSTER_BATCH_SIZE = int(os.environ.get("CLUSTER_BATCH_SIZE", "512"))
-N_CLUSTERS = int(os.environ.get("N_CLUSTERS", "8"))
+# "auto" picks k per dataset with a parallel sweep over CLUSTER_K_MIN..CLUSTER_K_MAX.
+N_CLUSTERS = os.environ.get("N_CLUSTERS", "8")
+N_CLUSTERS = N_CLUSTERS if N_CLUSTERS == "auto" else int(N_CLUSTERS)
+CLUSTER_K_MIN = int(os.environ.get("CLUSTER_K_MIN", "2"))
+CLUSTER_K_MAX = int(os.environ.get("CLUSTER_K_MAX", "20"))
+CLUSTER_K_SAMPLE = int(os.environ.get("CLUSTER_K_SAMPLE", "20000"))
+CLUSTER_SILHOUETTE_SAMPLE = int(os.environ.get("CLUSTER_SILHOUETTE_SAMPLE", "4000"))
+CLUSTER_K_TIME_BUDGET = float(os.environ.get("CLUSTER_K_TIME_BUDGET", "15"))
+# k used when no candidate finishes within the budget.
+CLUSTER_K_FALLBACK = int(os.environ.get("CLUSTER_K_FALLBACK", "8"))
+# Working-set cap for clustering: fit on a stratified sample, assign the rest
+# in chunks. CLUSTER_SUBCLUSTERS > 0 splits clusters above CLUSTER_SPLIT_SHARE.
+CLUSTER_MEMORY_CAP = int(os.environ.get("CLUSTER_MEMORY_CAP", str(1024 * 1024 * 1024)))
+CLUSTER_FIT_SAMPLE = int(os.environ.get("CLUSTER_FIT_SAMPLE", "100000"))
+CLUSTER_FIT_STRATA = int(os.environ.get("CLUSTER_FIT_STRATA", "16"))
+CLUSTER_SPLIT_SHARE = float(os.environ.get("CLUSTER_SPLIT_SHARE", "0.3"))
+CLUSTER_SUBCLUSTERS = int(os.environ.get("CLUSTER_SUBCLUSTERS", "0"))
+ANN_N_LISTS = int(os.environ.get("ANN_N_LISTS", "0"))
+ANN_N_PROBE = int(os.environ.get("ANN_N_PROBE", "8"))
+ANN_TRAIN_SAMPLE = int(os.environ.get("ANN_TRAIN_SAMPLE", "20000"))
+CLUSTER_K_JOBS = int(os.environ.get("CLUSTER_K_JOBS", str(os.cpu_count() or 1)))
+
+EMBEDDING_CACHE_CHUNK_SIZE = int(os.environ.get("EMBEDDING_CACHE_CHUNK_SIZE", "2000"))
+EMBEDDING_CACHE_CHUNK_BYTES = int(os.environ.get("EMBEDDING_CACHE_CHUNK_BYTES", str(16 * 1024 * 1024)))
+EMBEDDING_CACHE_TTL = int(os.environ.get("EMBEDDING_CACHE_TTL", "0"))
+EMBEDDING_LRU_MAX_BYTES = int(os.environ.get("EMBEDDING_LRU_MAX_BYTES", str(256 * 1024 * 1024)))
+EMBEDDING_CACHE_TIERS = [t.strip() for t in os.environ.get("EMBEDDING_CACHE_TIERS", "memory,disk").split(",") if t.strip()]
+EMBEDDING_STORE_MAX_BYTES = int(os.environ.get("EMBEDDING_STORE_MAX_BYTES", "0"))
+EMBEDDING_CACHE_EVICTION = os.environ.get("EMBEDDING_CACHE_EVICTION", "lru")
+# Estimated Jaccard over byte 4-shingles at which comments collapse before
+# embedding; 0 disables the near-duplicate stage.
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+MINHASH_PERMUTATIONS = int(os.environ.get("MINHASH_PERMUTATIONS", "32"))
+MINHASH_BANDS = int(os.environ.get("MINHASH_BANDS", "8"))
+EMBEDDING_STORAGE_DTYPE = os.environ.get("EMBEDDING_STORAGE_DTYPE", "float32")
+EMBEDDING_MATRIX_DTYPE = os.environ.get("EMBEDDING_MATRIX_DTYPE", "float32")
@@ -1,42 +1,392 @@
+import os
+import numpy as np
 import pandas as pd
 import time
+import scipy.sparse as sp
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.cluster import MiniBatchKMeans
-from config.settings import N_CLUSTERS, CLUSTER_BATCH_SIZE
-from intelligence.embeddings.embedder import generate_embeddings
+from sklearn.metrics import silhouette_score, pairwise_distances
+from config.settings import (
+    N_CLUSTERS,
+    CLUSTER_BATCH_SIZE,
+    EMBEDDING_MATRIX_DTYPE,
+    CLUSTER_K_MIN,
+    CLUSTER_K_MAX,
+    CLUSTER_K_SAMPLE,
+    CLUSTER_SILHOUETTE_SAMPLE,
+    CLUSTER_K_TIME_BUDGET,
+    CLUSTER_K_FALLBACK,
+    CLUSTER_K_JOBS,
+    CLUSTER_MEMORY_CAP,
+    CLUSTER_FIT_SAMPLE,
+    CLUSTER_FIT_STRATA,
+    CLUSTER_SPLIT_SHARE,
+    CLUSTER_SUBCLUSTERS
+)
+from intelligence.embeddings.router import embed
+from intelligence.embeddings.dedup import deduplicate
+from intelligence.embeddings.quantize import quantize, as_float32
+from intelligence.clustering.incremental import fold_comments, needs_fit
 
+# Passes over the k-selection sample per candidate, and the largest center
+# move between passes that still counts as converged.
+K_SELECT_EPOCHS = 10
+K_SELECT_TOL = 1e-3
 
-def cluster_embeddings(embeddings, n_clusters=N_CLUSTERS):
+
+def _stratified_sample(n, size, strata=CLUSTER_FIT_STRATA, seed=42):
+    # Equal share from each contiguous block of rows, so a sample of a file
+    # sorted by video or time still covers all of it.
+    if size >= n:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    edges = np.linspace(0, n, min(strata, size) + 1).astype(np.int64)
+    quotas = np.diff(np.linspace(0, size, len(edges)).astype(np.int64))
+    picks = [
+        lo + rng.choice(hi - lo, min(quota, hi - lo), replace=False)
+        for lo, hi, quota in zip(edges[:-1], edges[1:], quotas)
+    ]
+    return np.sort(np.concatenate(picks))
+
+
+def _budget(dim, memory_cap):
+    # Rows for the fit sample and per predict chunk. The sample is held as
+    # float32 alongside sklearn's working copies; chunks also carry a
+    # (rows, k) distance block, so both get a share of the cap.
+    row_bytes = dim * 4
+    fit_rows = max(1, min(CLUSTER_FIT_SAMPLE, memory_cap // (3 * row_bytes)))
+    chunk_rows = max(256, memory_cap // (6 * row_bytes))
+    return fit_rows, chunk_rows
+
+
+def _fit_sample(embeddings, rows, n_clusters, sample_weight, memory_cap):
+    # Fit on a stratified sample of rows, then assign all of them chunk by
+    # chunk; peak memory is bounded by memory_cap, not len(rows).
+    fit_rows, chunk_rows = _budget(embeddings.shape[1], memory_cap)
+    sample = rows[_stratified_sample(len(rows), max(fit_rows, n_clusters))]
     kmeans = MiniBatchKMeans(
-        n_clusters=n_clusters,
+        n_clusters=min(n_clusters, len(sample)),
         batch_size=CLUSTER_BATCH_SIZE,
         random_state=42
     )
-    labels = kmeans.fit_predict(embeddings)
+    weights = sample_weight[sample] if sample_weight is not None else None
+    kmeans.fit(as_float32(embeddings[sample]), sample_weight=weights)
+
+    labels = np.empty(len(rows), dtype=np.int64)
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        if chunk[-1] - chunk[0] == len(chunk) - 1:
+            block = as_float32(embeddings, chunk[0], chunk[-1] + 1)
+        else:
+            block = as_float32(embeddings[chunk])
+        labels[start:start + len(chunk)] = kmeans.predict(block)
     return labels
 
 
-def cluster_comments(csv_path, n_clusters=N_CLUSTERS, batch_size=100, progress_callback=None):
-    df = pd.read_csv(csv_path)
-    comments = df["comment"].astype(str).tolist()
+def cluster_embeddings(
+    embeddings,
+    n_clusters=N_CLUSTERS,
+    sample_weight=None,
+    memory_cap=CLUSTER_MEMORY_CAP,
+    split_share=CLUSTER_SPLIT_SHARE,
+    subclusters=CLUSTER_SUBCLUSTERS
+):
+    n = len(embeddings)
+    labels = _fit_sample(embeddings, np.arange(n), n_clusters, sample_weight, memory_cap)
+    if not subclusters:
+        return labels
+
+    # Split coarse clusters holding more than split_share of the (weighted)
+    # rows; the first sub-cluster keeps the coarse id.
+    weights = sample_weight if sample_weight is not None else np.ones(n)
+    shares = np.bincount(labels, weights=weights) / weights.sum()
+    next_id = labels.max() + 1
+    for cluster_id in np.flatnonzero(shares > split_share):
+        rows = np.flatnonzero(labels == cluster_id)
+        if len(rows) < 2 * subclusters:
+            continue
+        sub = _fit_sample(embeddings, rows, subclusters, sample_weight, memory_cap)
+        moved = sub > 0
+        labels[rows[moved]] = next_id + sub[moved] - 1
+        next_id += sub.max()
+    return labels
+
+
+def cluster_geometry(embeddings, labels, chunk_rows=8192):
+    # Centroids in embedding space and each row's Euclidean distance to its
+    # own centroid, in two streaming passes over float32 blocks.
+    labels = np.asarray(labels, dtype=np.int64)
+    cluster_ids = np.unique(labels)
+    position = np.searchsorted(cluster_ids, labels)
+    sums = np.zeros((len(cluster_ids), embeddings.shape[1]), dtype=np.float64)
+
+    for start in range(0, len(labels), chunk_rows):
+        block = as_float32(embeddings, start, start + chunk_rows)
+        pos = position[start:start + len(block)]
+        onehot = sp.csr_matrix((np.ones(len(pos)), (pos, np.arange(len(pos)))), shape=(len(cluster_ids), len(pos)))
+        sums += onehot @ block
+
+    centroids = (sums / np.bincount(position)[:, None]).astype(np.float32)
+    distances = np.empty(len(labels), dtype=np.float32)
+    for start in range(0, len(labels), chunk_rows):
+        block = as_float32(embeddings, start, start + chunk_rows)
+        distances[start:start + len(block)] = np.linalg.norm(block - centroids[position[start:start + len(block)]], axis=1)
+
+    return cluster_ids, centroids, distances
+
+
+def _grouped_top(labels, keys, k, rows=None):
+    # First k rows of each label after sorting by key ascending. With rows,
+    # labels/keys describe only those rows and the picks are mapped back.
+    order = np.lexsort((keys, labels))
+    sorted_labels = labels[order]
+    starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    picked = order[rank < k]
+    picked_labels = labels[picked]
+    if rows is not None:
+        picked = rows[picked]
+    return {
+        label.item(): picked[picked_labels == label].tolist()
+        for label in sorted_labels[starts]
+    }
+
+
+def select_representatives(labels, distances, likes=None, k=5, groups=None):
+    # Per cluster: the k most central comments, the k most liked and the k
+    # furthest from the centroid. Rows index the labelled frame positionally.
+    # groups gives each row's duplicate group (cluster_comments' dedup); each
+    # group then counts once, so repeats of one comment, which share its
+    # embedding and distance, can't fill a whole list.
+    labels = np.asarray(labels, dtype=np.int64)
+    distances = np.asarray(distances, dtype=np.float64)
+    likes = np.zeros(len(labels)) if likes is None else np.asarray(likes, dtype=np.float64)
+    # Ties on likes go to the more central comment.
+    like_rank = np.lexsort((distances, -likes)).argsort()
+
+    rows = liked_rows = np.arange(len(labels))
+    if groups is not None:
+        groups = np.asarray(groups)
+        rows = np.unique(groups, return_index=True)[1]
+        # A group's most liked row stands for it in the likes ranking.
+        order = np.lexsort((like_rank, groups))
+        liked_rows = order[np.flatnonzero(np.r_[True, groups[order][1:] != groups[order][:-1]])]
+
+    central = _grouped_top(labels[rows], distances[rows], k, rows)
+    liked = _grouped_top(labels[liked_rows], like_rank[liked_rows], k, liked_rows)
+    divergent = _grouped_top(labels[rows], -distances[rows], k, rows)
+    return {
+        cluster_id: {
+            "central": central[cluster_id],
+            "most_liked": liked[cluster_id],
+            "divergent": divergent[cluster_id]
+        }
+        for cluster_id in central
+    }
+
+
+def _elbow(ks, inertias):
+    # Point furthest below the chord of the normalized inertia curve.
+    if len(ks) < 3:
+        return ks[0] if ks else None
+    x = (np.asarray(ks, dtype=float) - ks[0]) / (ks[-1] - ks[0])
+    y = np.asarray(inertias, dtype=float)
+    y = (y - y.min()) / (np.ptp(y) or 1.0)
+    chord = y[0] + (y[-1] - y[0]) * x
+    return ks[int(np.argmax(chord - y))]
+
+
+def _fit_until(matrix, k, weights, deadline, max_epochs=K_SELECT_EPOCHS):
+    # MiniBatchKMeans driven one mini-batch at a time so a fit can be given
+    # up between steps once the deadline passes; returns None if it was.
+    # Stops early once an epoch barely moves the centers.
+    kmeans = MiniBatchKMeans(n_clusters=k, batch_size=CLUSTER_BATCH_SIZE, random_state=42)
+    order = np.random.default_rng(k).permutation(len(matrix))
+    # The first step also seeds the centers, from a larger slice as fit() does.
+    steps = [order[:3 * CLUSTER_BATCH_SIZE]] + [
+        order[start:start + CLUSTER_BATCH_SIZE]
+        for start in range(3 * CLUSTER_BATCH_SIZE, len(matrix), CLUSTER_BATCH_SIZE)
+    ]
+    for epoch in range(max_epochs):
+        previous = kmeans.cluster_centers_.copy() if epoch else None
+        for rows in steps:
+            if time.time() > deadline:
+                return None
+            kmeans.partial_fit(matrix[rows], sample_weight=weights[rows] if weights is not None else None)
+        if previous is not None and np.abs(kmeans.cluster_centers_ - previous).max() < K_SELECT_TOL:
+            break
+    return kmeans
+
+
+def select_k(
+    embeddings,
+    k_min=CLUSTER_K_MIN,
+    k_max=CLUSTER_K_MAX,
+    sample_weight=None,
+    sample_size=CLUSTER_K_SAMPLE,
+    silhouette_size=CLUSTER_SILHOUETTE_SAMPLE,
+    time_budget=CLUSTER_K_TIME_BUDGET,
+    n_jobs=CLUSTER_K_JOBS,
+    fallback_k=CLUSTER_K_FALLBACK
+):
+    # Fit every candidate k on one shared float32 sample in a thread pool and
+    # score it by silhouette on a smaller sub-sample whose distance matrix is
+    # computed once. Candidates still running when the budget is spent stop
+    # at their next mini-batch and are dropped; if none finished, fallback_k
+    # is used. A silhouette peak on the edge of the sweep only says the curve
+    # had not turned yet, so the elbow is used instead. The pool overlaps
+    # fits inside numpy/BLAS, which release the GIL, but the mini-batch loop
+    # holds it and sklearn runs its own threads per fit, so n_jobs is not one
+    # core per candidate; it mostly bounds how many fits share the budget.
+    # Returns (k, diagnostics).
+    start = time.time()
+    n = len(embeddings)
+    k_max = min(k_max, n - 1)
+    if k_max < max(k_min, 2):
+        k = max(1, min(k_min, n))
+        return k, {"k": k, "candidates": [], "silhouette_k": None, "elbow_k": None, "skipped": [], "sample_size": n, "seconds": 0.0}
+
+    rng = np.random.default_rng(42)
+    sample = np.sort(rng.choice(n, min(sample_size, n), replace=False))
+    matrix = np.ascontiguousarray(as_float32(embeddings[sample]))
+    weights = sample_weight[sample] if sample_weight is not None else None
+    scored = rng.choice(len(sample), min(silhouette_size, len(sample)), replace=False)
+    distances = pairwise_distances(matrix[scored], n_jobs=1).astype(np.float32)
+    deadline = start + time_budget
+
+    def evaluate(k):
+        fit_start = time.time()
+        kmeans = _fit_until(matrix, k, weights, deadline)
+        if kmeans is None:
+            return None
+        labels = kmeans.predict(matrix)
+        silhouette = None
+        if len(np.unique(labels[scored])) > 1:
+            silhouette = float(silhouette_score(distances, labels[scored], metric="precomputed"))
+        return {
+            "k": k,
+            "silhouette": silhouette,
+            "inertia": float(-kmeans.score(matrix, sample_weight=weights)),
+            "fit_seconds": round(time.time() - fit_start, 3)
+        }
+
+    # Interleave small and large k so a budget cut still leaves a spread.
+    ks = list(range(max(k_min, 2), k_max + 1))
+    ks = ks[::2] + ks[1::2]
+    with ThreadPoolExecutor(max_workers=max(1, n_jobs)) as pool:
+        results = dict(zip(ks, pool.map(evaluate, ks)))
+
+    candidates = sorted((c for c in results.values() if c is not None), key=lambda c: c["k"])
+    skipped = sorted(k for k, c in results.items() if c is None)
+    elbow_k = _elbow([c["k"] for c in candidates], [c["inertia"] for c in candidates])
+    with_score = [c for c in candidates if c["silhouette"] is not None]
+    silhouette_k = max(with_score, key=lambda c: c["silhouette"])["k"] if with_score else None
+    # k = 2 is a real floor, not an edge of the sweep.
+    on_edge = silhouette_k is not None and len(candidates) >= 3 and (
+        silhouette_k == candidates[-1]["k"] or silhouette_k == candidates[0]["k"] > 2
+    )
+    if silhouette_k is not None and not on_edge:
+        k = silhouette_k
+    else:
+        k = elbow_k or min(max(fallback_k, k_min), k_max)
+
+    return k, {
+        "k": k,
+        "candidates": candidates,
+        "silhouette_k": silhouette_k,
+        "elbow_k": elbow_k,
+        "skipped": skipped,
+        "sample_size": len(sample),
+        "seconds": round(time.time() - start, 3)
+    }
+
+
+def _comment_frame(comments, text_col):
+    # A DataFrame, a bare text column (Series, array, list) or, for older
+    # callers, a CSV path. Frames are copied shallowly: label columns are added
+    # to our copy while the text column stays shared with the caller.
+    if isinstance(comments, (str, os.PathLike)):
+        return pd.read_csv(comments)
+    if isinstance(comments, pd.DataFrame):
+        df = comments.copy(deep=False)
+    else:
+        if not isinstance(comments, pd.Series):
+            comments = pd.Series(comments)
+        df = comments.to_frame(text_col)
+    # Rows line up positionally with the embeddings from here on.
+    df.index = pd.RangeIndex(len(df))
+    return df
+
+
+def cluster_comments(comments, n_clusters=N_CLUSTERS, batch_size=None, progress_callback=None, incremental_key=None, text_col="comment"):
+    df = _comment_frame(comments, text_col)
+
+    # Embed and cluster each distinct comment once, weighted by how often it occurs.
+    unique_comments, inverse, counts = deduplicate(df[text_col])
 
     embed_start = time.time()
-    embeddings = generate_embeddings(comments, batch_size=batch_size)
+    embed_stats = {}
+    unique_embeddings = embed(
+        unique_comments,
+        batch_size=batch_size,
+        progress_callback=progress_callback,
+        stats_callback=embed_stats.update
+    )
+    failed = embed_stats.get("failed", [])
+    unembedded_rows = []
+    if failed:
+        # Comments the provider rejected have no vector; leave them out rather
+        # than clustering zero vectors. Their positions in the input are kept
+        # in attrs so callers can line up per-row data with what remains.
+        embedded = np.ones(len(unique_comments), dtype=bool)
+        embedded[failed] = False
+        if not embedded.any():
+            raise ValueError("None of the comments could be embedded")
+        rows = embedded[inverse]
+        unembedded_rows = np.flatnonzero(~rows).tolist()
+        df = df[rows].reset_index(drop=True)
+        unique_comments = [t for t, ok in zip(unique_comments, embedded) if ok]
+        inverse = (np.cumsum(embedded) - 1)[inverse[rows]]
+        counts = counts[embedded]
+        unique_embeddings = unique_embeddings[embedded]
+    unique_embeddings = quantize(unique_embeddings, EMBEDDING_MATRIX_DTYPE)
     embedding_time = time.time() - embed_start
 
     cluster_start = time.time()
-    kmeans = MiniBatchKMeans(
-        n_clusters=n_clusters,
-        batch_size=CLUSTER_BATCH_SIZE,
-        random_state=42
-    )
-    labels = kmeans.fit_predict(embeddings)
+    k_selection = None
+    namespace = embed_stats.get("namespace")
+    fresh_state = incremental_key is None or needs_fit(incremental_key, unique_embeddings.shape[1], namespace)
+    if n_clusters == "auto" and fresh_state:
+        n_clusters, k_selection = select_k(unique_embeddings, sample_weight=counts)
+    if incremental_key is not None:
+        # Fold this batch into the persisted (creator, video) clusters; counts
+        # and shares cover every comment seen so far, not just this batch.
+        # Saved centroids from another embedding space are discarded first.
+        ids = df["comment_id"].tolist() if "comment_id" in df.columns else None
+        labels, new, state = fold_comments(
+            incremental_key, unique_embeddings, inverse, ids=ids, n_clusters=n_clusters, namespace=namespace
+        )
+        df["is_new"] = new
+        cluster_counts = state.cluster_counts()
+        total_comments = state.total
+    else:
+        unique_labels = cluster_embeddings(unique_embeddings, n_clusters=n_clusters, sample_weight=counts)
+        labels = unique_labels[inverse]
+        cluster_counts = None
     clustering_time = time.time() - cluster_start
 
-    df["cluster"] = labels
-    cluster_counts = df["cluster"].value_counts().to_dict()
-    total_comments = len(df)
+    embeddings = unique_embeddings[inverse]
 
-    if progress_callback:
-        progress_callback(1, 1, 0)
+    df["cluster"] = labels
+    # Rows with the same value are one comment (exact or near-duplicate).
+    df["duplicate_group"] = inverse
+    df.attrs["k_selection"] = k_selection
+    df.attrs["unembedded_rows"] = unembedded_rows
+    # True when the persisted clusters were fitted from scratch: the first
+    # batch for the key, or saved centroids from another embedding space.
+    df.attrs["clusters_refit"] = incremental_key is not None and fresh_state
+    if cluster_counts is None:
+        cluster_counts = df["cluster"].value_counts().to_dict()
+        total_comments = len(df)
 
     return df, cluster_counts, total_comments, embeddings, embedding_time, clustering_time
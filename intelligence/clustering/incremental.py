@@ -0,0 +1,197 @@
+import os
+import re
+import fcntl
+import pickle
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+
+from config.settings import CLUSTER_STATE_DIR, CLUSTER_BATCH_SIZE, N_CLUSTERS
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", str(value))
+
+
+def state_path(key, root=CLUSTER_STATE_DIR):
+    creator_id, video_id = key
+    return os.path.join(root, _slug(creator_id or "default"), f"{_slug(video_id)}.pkl")
+
+
+class ClusterState:
+    # Running centroids and per-cluster aggregates for one (creator, video).
+    # Sizes count comments at assignment time; earlier comments are not
+    # relabelled when centroids drift. namespace is the embedding cache
+    # namespace the centroids were fitted in.
+
+    def __init__(self, n_clusters=N_CLUSTERS):
+        self.n_clusters = n_clusters
+        self.reset()
+
+    def reset(self):
+        self.kmeans = None
+        self.dim = None
+        self.namespace = None
+        # Sorted uint64 hashes of comment ids already folded in.
+        self.seen = np.zeros(0, dtype=np.uint64)
+        self.sizes = np.zeros(0, dtype=np.int64)
+        # Likes/sentiment are folded in after insights run, so they keep their
+        # own row counts.
+        self.metric_rows = np.zeros(0, dtype=np.int64)
+        self.likes_sum = np.zeros(0)
+        self.likes_sq = np.zeros(0)
+        self.sentiment_sum = np.zeros(0)
+
+    @property
+    def total(self):
+        return int(self.sizes.sum())
+
+    def _grow(self, k):
+        pad = k - len(self.sizes)
+        if pad <= 0:
+            return
+        self.sizes = np.concatenate([self.sizes, np.zeros(pad, dtype=np.int64)])
+        self.metric_rows = np.concatenate([self.metric_rows, np.zeros(pad, dtype=np.int64)])
+        self.likes_sum = np.concatenate([self.likes_sum, np.zeros(pad)])
+        self.likes_sq = np.concatenate([self.likes_sq, np.zeros(pad)])
+        self.sentiment_sum = np.concatenate([self.sentiment_sum, np.zeros(pad)])
+
+    def update(self, embeddings, weights):
+        # embeddings: float32 (n, d) of distinct texts; weights: how many
+        # not-yet-seen comments each text stands for (0 = predict only).
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        fresh = weights > 0
+        if self.kmeans is None:
+            self.kmeans = MiniBatchKMeans(
+                n_clusters=min(self.n_clusters, len(embeddings)),
+                batch_size=CLUSTER_BATCH_SIZE,
+                random_state=42
+            )
+            self.kmeans.fit(embeddings, sample_weight=np.maximum(weights, 1))
+            self.dim = embeddings.shape[1]
+        elif fresh.any():
+            self.kmeans.partial_fit(embeddings[fresh], sample_weight=weights[fresh])
+
+        labels = self.kmeans.predict(embeddings)
+        self._grow(self.kmeans.n_clusters)
+        np.add.at(self.sizes, labels[fresh], weights[fresh])
+        return labels
+
+    def observe(self, labels, likes, sentiment):
+        labels = np.asarray(labels, dtype=np.int64)
+        likes = np.asarray(likes, dtype=float)
+        self._grow(int(labels.max()) + 1 if len(labels) else 0)
+        np.add.at(self.metric_rows, labels, 1)
+        np.add.at(self.likes_sum, labels, likes)
+        np.add.at(self.likes_sq, labels, likes ** 2)
+        np.add.at(self.sentiment_sum, labels, np.asarray(sentiment, dtype=float))
+
+    def cluster_counts(self):
+        return {int(c): int(n) for c, n in enumerate(self.sizes) if n}
+
+    def metrics(self):
+        # Same columns as the batch cluster_metrics frame.
+        rows = np.maximum(self.metric_rows, 1)
+        mean = self.likes_sum / rows
+        var = (self.likes_sq - rows * mean ** 2) / np.maximum(self.metric_rows - 1, 1)
+        present = self.sizes > 0
+        return pd.DataFrame({
+            "cluster": np.flatnonzero(present),
+            "cluster_size": self.sizes[present],
+            "avg_likes": mean[present],
+            "avg_sentiment": (self.sentiment_sum / rows)[present],
+            "engagement_std": np.where(self.metric_rows > 1, np.sqrt(np.maximum(var, 0)), np.nan)[present]
+        })
+
+
+def load_state(key, n_clusters=N_CLUSTERS, root=CLUSTER_STATE_DIR):
+    path = state_path(key, root)
+    if not os.path.exists(path):
+        return ClusterState(n_clusters)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def save_state(key, state, root=CLUSTER_STATE_DIR):
+    path = state_path(key, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def space_changed(state, dim, namespace=None):
+    # Centroids from another model, or another fit of the same model, cannot
+    # take new vectors even when the dimension matches. States saved before
+    # namespaces were recorded count as changed.
+    if state.dim is not None and state.dim != dim:
+        return True
+    return namespace is not None and state.kmeans is not None and getattr(state, "namespace", None) != namespace
+
+
+def needs_fit(key, dim, namespace=None, root=CLUSTER_STATE_DIR):
+    # True when the next batch for key starts from scratch rather than folding in.
+    state = load_state(key, root=root)
+    return state.kmeans is None or space_changed(state, dim, namespace)
+
+
+@contextmanager
+def locked_state(key, n_clusters=N_CLUSTERS, root=CLUSTER_STATE_DIR):
+    # Load-modify-save under an exclusive lock so two workers refreshing the
+    # same video don't drop each other's comments.
+    path = state_path(key, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            state = load_state(key, n_clusters, root)
+            yield state
+            save_state(key, state, root)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def fold_comments(key, embeddings, inverse, ids=None, n_clusters=N_CLUSTERS, namespace=None, root=CLUSTER_STATE_DIR):
+    # Assign a batch of comments to the persisted clusters and fold the
+    # unseen ones in. embeddings holds one row per distinct text, inverse maps
+    # comments onto those rows. Returns per-comment labels, a mask of comments
+    # that were new, and the updated state.
+    inverse = np.asarray(inverse, dtype=np.int64)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    with locked_state(key, n_clusters, root) as state:
+        if space_changed(state, embeddings.shape[1], namespace):
+            # Embedding space changed; the old centroids live in another space,
+            # and the k chosen for the new one replaces the persisted k.
+            state.reset()
+            if n_clusters != "auto":
+                state.n_clusters = n_clusters
+        if namespace is not None:
+            state.namespace = namespace
+        if ids is None:
+            new = np.ones(len(inverse), dtype=bool)
+        else:
+            keys = pd.util.hash_pandas_object(pd.Series([str(i) for i in ids], dtype="object"), index=False).to_numpy()
+            new = np.ones(len(keys), dtype=bool)
+            if len(state.seen):
+                pos = np.minimum(np.searchsorted(state.seen, keys), len(state.seen) - 1)
+                new = state.seen[pos] != keys
+            # Repeated ids inside one batch count once.
+            _, first = np.unique(keys, return_index=True)
+            once = np.zeros(len(keys), dtype=bool)
+            once[first] = True
+            new &= once
+            added = np.sort(keys[new])
+            state.seen = np.insert(state.seen, np.searchsorted(state.seen, added), added)
+
+        weights = np.bincount(inverse[new], minlength=len(embeddings)).astype(float)
+        labels = state.update(embeddings, weights)
+    return labels[inverse], new, state
+
+
+def observe_comments(key, labels, likes, sentiment, n_clusters=N_CLUSTERS, root=CLUSTER_STATE_DIR):
+    with locked_state(key, n_clusters, root) as state:
+        state.observe(labels, likes, sentiment)
+    return state
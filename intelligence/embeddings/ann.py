@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import shutil
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from config.settings import ANN_N_LISTS, ANN_N_PROBE, ANN_TRAIN_SAMPLE, CLUSTER_BATCH_SIZE, STORAGE_PROCESSED_DIR
+from intelligence.embeddings.quantize import as_float32
+
+ARRAYS = ("vectors", "rows", "centroids", "offsets")
+
+
+def _unit(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def _top(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class IVFIndex:
+    # Inverted-file index for cosine similarity. Unit vectors are grouped by
+    # their nearest coarse centroid and stored contiguously per list; a query
+    # scans only the n_probe lists whose centroids score highest.
+
+    def __init__(self, vectors, rows, centroids, offsets):
+        self.vectors = vectors
+        self.rows = rows
+        self.centroids = centroids
+        self.offsets = offsets
+        # Position of each original row inside the list-ordered matrix.
+        self._position = np.empty(len(rows), dtype=np.int64)
+        self._position[rows] = np.arange(len(rows))
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=ANN_N_LISTS, train_sample=ANN_TRAIN_SAMPLE):
+        n = len(embeddings)
+        dim = embeddings.shape[1] if n else 0
+        vectors = np.empty((n, dim), dtype=np.float32)
+        for start in range(0, n, 8192):
+            vectors[start:start + 8192] = as_float32(embeddings, start, start + 8192)
+        _unit(vectors)
+
+        n_lists = n_lists or int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        if n_lists == 1:
+            centroids = _unit(vectors.mean(axis=0, keepdims=True)) if n else np.zeros((1, dim), dtype=np.float32)
+            assign = np.zeros(n, dtype=np.int64)
+        else:
+            rng = np.random.default_rng(42)
+            sample = rng.choice(n, min(train_sample, n), replace=False)
+            kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=CLUSTER_BATCH_SIZE, random_state=42)
+            kmeans.fit(vectors[sample])
+            centroids = _unit(kmeans.cluster_centers_.astype(np.float32))
+            assign = np.concatenate([
+                np.argmax(vectors[start:start + 8192] @ centroids.T, axis=1)
+                for start in range(0, n, 8192)
+            ])
+
+        rows = np.argsort(assign, kind="stable")
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+        return cls(np.ascontiguousarray(vectors[rows]), rows, centroids, offsets)
+
+    def vector(self, row):
+        return self.vectors[self._position[row]]
+
+    def search(self, query, k=10, n_probe=ANN_N_PROBE, allowed=None, exclude=None):
+        # Top-k rows by cosine similarity to query. allowed is an optional
+        # boolean mask over rows (e.g. one cluster); exclude drops given rows.
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        lists = _top(self.centroids @ query, n_probe)
+        spans = [(self.offsets[i], self.offsets[i + 1]) for i in lists]
+        # Lists are contiguous, so each is scored on a view with no gather.
+        scores = np.concatenate([self.vectors[a:b] @ query for a, b in spans])
+        rows = np.concatenate([self.rows[a:b] for a, b in spans])
+        keep = np.ones(len(rows), dtype=bool)
+        if allowed is not None:
+            keep &= allowed[rows]
+        if exclude is not None:
+            keep &= ~np.isin(rows, exclude)
+        if not keep.all():
+            rows, scores = rows[keep], scores[keep]
+
+        top = _top(scores, k)
+        return rows[top], scores[top]
+
+    def similar(self, row, k=10, n_probe=ANN_N_PROBE):
+        return self.search(self.vector(row), k=k, n_probe=n_probe, exclude=[row])
+
+    def save(self, path):
+        # Each save writes a complete build into its own subdirectory, then
+        # swaps manifest.json to point at it, so a reader never mixes arrays
+        # from two builds. The build before it is kept for readers that read
+        # the old manifest just before the swap.
+        os.makedirs(path, exist_ok=True)
+        previous = current_build(path)
+        version = f"{time.time_ns()}-{os.getpid()}"
+        build = os.path.join(path, version)
+        os.makedirs(build)
+        for name in ARRAYS:
+            np.save(os.path.join(build, f"{name}.npy"), getattr(self, name))
+
+        tmp_path = os.path.join(path, f"manifest.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": version}, f)
+        os.replace(tmp_path, os.path.join(path, "manifest.json"))
+
+        keep = {build, previous}
+        for entry in os.scandir(path):
+            if entry.is_dir() and entry.path not in keep:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path):
+        # vectors are memory-mapped, so loading is cheap and pages are shared
+        # between processes serving the same dataset.
+        build = current_build(path)
+        return cls(*[
+            np.load(os.path.join(build, f"{name}.npy"), mmap_mode="r" if name == "vectors" else None)
+            for name in ARRAYS
+        ])
+
+
+def current_build(path):
+    # Directory holding the arrays of the latest complete save; indexes saved
+    # before manifests existed keep their arrays in path itself.
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            return os.path.join(path, json.load(f)["version"])
+    except FileNotFoundError:
+        return path
+
+
+def dataset_index_path(dataset_id):
+    return os.path.join(STORAGE_PROCESSED_DIR, f"{dataset_id}_ann")
+
+
+_loaded = {}
+
+
+def load_dataset_index(dataset_id):
+    # Cached per process; a reprocessed dataset is picked up by its new build.
+    build = current_build(dataset_index_path(dataset_id))
+    if not os.path.exists(os.path.join(build, "offsets.npy")):
+        return None
+    cached = _loaded.get(dataset_id)
+    if cached is None or cached[0] != build:
+        # A build directory has no manifest, so it loads as itself.
+        cached = (build, IVFIndex.load(build))
+        _loaded[dataset_id] = cached
+    return cached[1]
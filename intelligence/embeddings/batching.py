@@ -0,0 +1,27 @@
+from config.settings import EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_TOKENS
+
+
+def estimate_tokens(text):
+    # BPE averages ~4 bytes per token on English; 3 keeps emoji-heavy
+    # comments on the safe side without calling a tokenizer.
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def plan_batches(texts, max_tokens=EMBEDDING_BATCH_TOKENS, max_items=EMBEDDING_BATCH_SIZE):
+    max_items = max(1, max_items or EMBEDDING_BATCH_SIZE)
+    max_tokens = max(1, max_tokens or EMBEDDING_BATCH_TOKENS)
+
+    spans = []
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (i - start >= max_items or tokens + cost > max_tokens):
+            spans.append((start, i))
+            start = i
+            tokens = 0
+        tokens += cost
+
+    if start < len(texts):
+        spans.append((start, len(texts)))
+    return spans
@@ -0,0 +1,208 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config.settings import (
+    EMBEDDING_CACHE_CHUNK_SIZE,
+    EMBEDDING_CACHE_CHUNK_BYTES,
+    EMBEDDING_CACHE_TTL,
+    EMBEDDING_STORAGE_DTYPE,
+    EMBEDDING_LRU_MAX_BYTES
+)
+from intelligence.embeddings.quantize import row_dtype, encode_rows, decode_rows
+
+
+def encode_vector(vector, dtype=EMBEDDING_STORAGE_DTYPE):
+    vector = np.asarray(vector, dtype=np.float32)
+    return encode_rows(vector[None, :], dtype).tobytes()
+
+
+def decode_vector(payload, dtype=EMBEDDING_STORAGE_DTYPE):
+    if dtype == "int8":
+        dim = len(payload) - 4
+    else:
+        dim = len(payload) // np.dtype(dtype).itemsize
+    rows = np.frombuffer(payload, dtype=row_dtype(dtype, dim))
+    return decode_rows(rows, dtype).reshape(dim)
+
+
+def hit_rate(stats):
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else 0.0
+
+
+class LRUEmbeddingCache:
+    # In-process tier bounded by vector bytes rather than entry count.
+    name = "memory"
+
+    def __init__(self, max_bytes=EMBEDDING_LRU_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        vectors = None
+
+        with self._lock:
+            for i, h in enumerate(hashes):
+                row = self._entries.get(h)
+                if row is None:
+                    continue
+                self._entries.move_to_end(h)
+                if vectors is None:
+                    vectors = np.zeros((len(hashes), len(row)), dtype=np.float32)
+                elif len(row) != vectors.shape[1]:
+                    continue
+                vectors[i] = row
+                found[i] = True
+
+            hits = int(found.sum())
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(hashes) - hits
+        return vectors, found
+
+    def set_many(self, hashes, vectors):
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            for h, vector in zip(hashes, vectors):
+                row = np.array(vector, dtype=np.float32)
+                previous = self._entries.pop(h, None)
+                if previous is not None:
+                    self.nbytes -= previous.nbytes
+                self._entries[h] = row
+                self.nbytes += row.nbytes
+                self.stats["writes"] += 1
+
+            while self.nbytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.stats["evictions"] += 1
+
+
+class TieredEmbeddingCache:
+    # Looks tiers up in order; hits from a slower tier are copied into the
+    # faster ones so hot phrases stay in process.
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+
+    @property
+    def stats(self):
+        return {
+            tier.name: {**tier.stats, "hit_rate": hit_rate(tier.stats)}
+            for tier in self.tiers
+        }
+
+    def get_many(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        vectors = None
+
+        for depth, tier in enumerate(self.tiers):
+            pending = np.flatnonzero(~found)
+            if len(pending) == 0:
+                break
+            tier_vectors, tier_found = tier.get_many([hashes[i] for i in pending])
+            if not tier_found.any():
+                continue
+
+            if vectors is None:
+                vectors = np.zeros((len(hashes), tier_vectors.shape[1]), dtype=np.float32)
+            elif tier_vectors.shape[1] != vectors.shape[1]:
+                continue
+            hit = pending[tier_found]
+            vectors[hit] = tier_vectors[tier_found]
+            found[hit] = True
+
+            for faster in self.tiers[:depth]:
+                faster.set_many([hashes[i] for i in hit], vectors[hit])
+
+        return vectors, found
+
+    def set_many(self, hashes, vectors):
+        for tier in self.tiers:
+            tier.set_many(hashes, vectors)
+
+
+class RedisEmbeddingCache:
+    # Bulk MGET / pipelined SET so a dataset costs one round trip per chunk
+    # instead of one per text. Chunks are capped by key count and, for writes,
+    # by payload bytes.
+    name = "redis"
+
+    def __init__(
+        self,
+        client,
+        prefix="embed",
+        chunk_size=EMBEDDING_CACHE_CHUNK_SIZE,
+        chunk_bytes=EMBEDDING_CACHE_CHUNK_BYTES,
+        ttl=EMBEDDING_CACHE_TTL,
+        dtype=EMBEDDING_STORAGE_DTYPE
+    ):
+        self.client = client
+        # Quantized entries live under their own prefix so a dtype switch never
+        # decodes old payloads with the wrong layout.
+        self.prefix = prefix if dtype == "float32" else f"{prefix}:{dtype}"
+        self.dtype = dtype
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_bytes = max(1, chunk_bytes)
+        self.ttl = ttl or None
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "round_trips": 0}
+
+    def _key(self, h):
+        return f"{self.prefix}:{h}"
+
+    def get_many(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        vectors = None
+
+        for start in range(0, len(hashes), self.chunk_size):
+            chunk = hashes[start:start + self.chunk_size]
+            values = self.client.mget([self._key(h) for h in chunk])
+            self.stats["round_trips"] += 1
+
+            for j, value in enumerate(values):
+                if value is None:
+                    continue
+                row = decode_vector(value, self.dtype)
+                if vectors is None:
+                    vectors = np.zeros((len(hashes), len(row)), dtype=np.float32)
+                elif len(row) != vectors.shape[1]:
+                    continue
+                vectors[start + j] = row
+                found[start + j] = True
+
+        hits = int(found.sum())
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(hashes) - hits
+        return vectors, found
+
+    def set_many(self, hashes, vectors):
+        pipe = self.client.pipeline(transaction=False)
+        pending = 0
+        pending_bytes = 0
+
+        for h, vector in zip(hashes, vectors):
+            payload = encode_vector(vector, self.dtype)
+            pipe.set(self._key(h), payload, ex=self.ttl)
+            pending += 1
+            pending_bytes += len(payload)
+
+            if pending >= self.chunk_size or pending_bytes >= self.chunk_bytes:
+                pipe.execute()
+                self.stats["round_trips"] += 1
+                self.stats["writes"] += pending
+                pending = 0
+                pending_bytes = 0
+
+        if pending:
+            pipe.execute()
+            self.stats["round_trips"] += 1
+            self.stats["writes"] += pending
@@ -0,0 +1,85 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from config.settings import NEAR_DUPLICATE_THRESHOLD
+from intelligence.embeddings.minhash import near_duplicate_groups
+
+WHITESPACE_RE = re.compile(r"\s+")
+# "part 2??" -> "part 2?", "🔥🔥🔥" -> "🔥"
+REPEAT_RE = re.compile(r"([^\w\s])\1+")
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    text = WHITESPACE_RE.sub(" ", text).strip()
+    return REPEAT_RE.sub(r"\1", text)
+
+
+def _repeat_rows(joined):
+    # Rows of a NUL-joined corpus holding a character REPEAT_RE would
+    # collapse: a run of one non-word, non-space character.
+    codes = np.frombuffer(joined.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    runs = np.flatnonzero(codes[1:] == codes[:-1])
+    if not len(runs):
+        return []
+    repeated = codes[runs]
+    punct = [c for c in np.unique(repeated).tolist() if c and not (chr(c).isalnum() or chr(c) == "_" or chr(c).isspace())]
+    runs = runs[np.isin(repeated, punct)]
+    return np.unique(np.searchsorted(np.flatnonzero(codes == 0), runs)).tolist()
+
+
+def normalize_texts(texts):
+    # normalize_text over a whole column, a handful of passes over one joined
+    # string instead of a regex and NFKC call per row. NUL separates rows;
+    # none of the steps creates, removes or merges across one.
+    if hasattr(texts, "to_numpy"):
+        # Arrow-backed columns box one value at a time when iterated.
+        texts = texts.to_numpy(dtype=object)
+    texts = [str(t) for t in texts]
+    if not texts:
+        return []
+    joined = "\0".join(texts)
+    if joined.count("\0") != len(texts) - 1:
+        return [normalize_text(t) for t in texts]
+    if not joined.isascii():
+        joined = unicodedata.normalize("NFKC", joined)
+    # split() drops the same whitespace as \s; a row boundary keeps at most
+    # one space on either side after the join, which is then stripped.
+    joined = " ".join(joined.lower().split())
+    rows = joined.replace(" \0", "\0").replace("\0 ", "\0").split("\0")
+    for i in _repeat_rows(joined):
+        rows[i] = REPEAT_RE.sub(r"\1", rows[i])
+    return rows
+
+
+def deduplicate(texts, near_threshold=NEAR_DUPLICATE_THRESHOLD):
+    if hasattr(texts, "to_numpy"):
+        # One conversion up front; Arrow-backed columns box a value per
+        # positional lookup, which cost more than the MinHash pass.
+        texts = texts.to_numpy(dtype=object)
+    normalized = normalize_texts(texts)
+    inverse, uniques = pd.factorize(pd.Series(normalized, dtype="object"), sort=False)
+    inverse = inverse.astype(np.int64)
+
+    counts = np.bincount(inverse)
+    # factorize numbers groups by first appearance, so the first row of each
+    # group is its representative.
+    first = np.full(len(counts), len(inverse), dtype=np.int64)
+    np.minimum.at(first, inverse, np.arange(len(inverse)))
+
+    if near_threshold and len(counts) > 1:
+        # Fold near-identical texts (bot waves, copy-paste spam) into one
+        # group; its most frequent exact text becomes the canonical one.
+        groups = near_duplicate_groups(list(uniques), threshold=near_threshold)
+        order = np.lexsort((np.arange(len(counts)), -counts, groups))
+        canonical = order[np.flatnonzero(np.r_[True, np.diff(groups[order]) != 0])]
+        first = first[canonical]
+        counts = np.bincount(groups, weights=counts).astype(np.int64)
+        inverse = groups[inverse]
+
+    unique_texts = [str(t) for t in np.asarray(texts, dtype=object)[first]]
+    return unique_texts, inverse, counts
+
@@ -0,0 +1,161 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config.settings import (
+    EMBEDDING_MAX_IN_FLIGHT,
+    EMBEDDING_MIN_IN_FLIGHT,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_RETRY_BACKOFF,
+    EMBEDDING_MAX_SPLIT_CALLS
+)
+
+RETRYABLE_STATUS = {408, 409, 429}
+# Statuses that blame the payload rather than the service or credentials.
+SPLITTABLE_STATUS = {400, 413, 422}
+# Sent alone to tell a bad input from a bad request (model, dimensions).
+PROBE_TEXT = "ok"
+
+
+def is_retryable(exc):
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+def isolate_bad_inputs(call, retryable=is_retryable, max_split_calls=EMBEDDING_MAX_SPLIT_CALLS):
+    # Bisect a rejected batch until the offending inputs are isolated; those
+    # come back as None instead of failing their neighbours. The first
+    # rejection is checked once with PROBE_TEXT: if that is rejected too, the
+    # request itself is at fault and the original error is raised rather than
+    # splitting every batch down to single texts. Splitting spends at most
+    # max_split_calls calls; a sub-batch left over after that is rejected whole.
+    lock = threading.Lock()
+    state = {"request_ok": None, "calls": 0}
+
+    def splittable(exc):
+        return not retryable(exc) and getattr(exc, "status_code", None) in SPLITTABLE_STATUS
+
+    def request_rejected():
+        with lock:
+            if state["request_ok"] is None:
+                state["calls"] += 1
+                try:
+                    call([PROBE_TEXT])
+                    state["request_ok"] = True
+                except Exception as exc:
+                    # A transient probe failure proves nothing; ask again next time.
+                    if splittable(exc):
+                        state["request_ok"] = False
+            return state["request_ok"] is False
+
+    def spend(n):
+        with lock:
+            if state["calls"] + n > max_split_calls:
+                return False
+            state["calls"] += n
+            return True
+
+    def guarded(batch):
+        try:
+            # Passed through untouched, so a provider's matrix reaches the
+            # caller without being split into per-row objects.
+            return call(batch)
+        except Exception as exc:
+            if not splittable(exc) or request_rejected():
+                raise
+            if len(batch) == 1 or not spend(2):
+                return [None] * len(batch)
+            mid = len(batch) // 2
+            return list(guarded(batch[:mid])) + list(guarded(batch[mid:]))
+
+    return guarded
+
+
+class AdaptiveLimit:
+    # AIMD: one extra slot after a full window of successes, halve on throttling.
+
+    def __init__(self, start, minimum, maximum):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.value = min(max(start, self.minimum), self.maximum)
+        self._successes = 0
+
+    def success(self):
+        self._successes += 1
+        if self._successes >= self.value:
+            self._successes = 0
+            self.value = min(self.value + 1, self.maximum)
+
+    def failure(self):
+        self._successes = 0
+        self.value = max(self.value // 2, self.minimum)
+
+
+def dispatch_batches(
+    batches,
+    call,
+    max_in_flight=EMBEDDING_MAX_IN_FLIGHT,
+    min_in_flight=EMBEDDING_MIN_IN_FLIGHT,
+    max_retries=EMBEDDING_MAX_RETRIES,
+    backoff=EMBEDDING_RETRY_BACKOFF,
+    retryable=is_retryable,
+    progress_callback=None,
+    result_callback=None
+):
+    results = [None] * len(batches)
+    if not batches:
+        return results
+
+    limit = AdaptiveLimit(max(min_in_flight, max_in_flight // 2), min_in_flight, max_in_flight)
+    attempts = [0] * len(batches)
+    # (ready_at, batch index); retries are pushed back with a delay.
+    queue = [(0.0, i) for i in range(len(batches))]
+    in_flight = {}
+    done = 0
+    start = time.time()
+
+    with ThreadPoolExecutor(max_workers=limit.maximum) as pool:
+        while queue or in_flight:
+            now = time.time()
+            queue.sort()
+            while queue and len(in_flight) < limit.value and queue[0][0] <= now:
+                _, i = queue.pop(0)
+                in_flight[pool.submit(call, batches[i])] = i
+
+            if not in_flight:
+                time.sleep(max(0.0, queue[0][0] - now))
+                continue
+
+            timeout = max(0.0, queue[0][0] - now) if queue and len(in_flight) < limit.value else None
+            finished, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                i = in_flight.pop(future)
+                exc = future.exception()
+
+                if exc is None:
+                    results[i] = future.result()
+                    limit.success()
+                    done += 1
+                    if result_callback:
+                        result_callback(i, results[i])
+                    if progress_callback:
+                        elapsed = time.time() - start
+                        eta_seconds = elapsed / done * (len(batches) - done)
+                        progress_callback(done, len(batches), eta_seconds)
+                    continue
+
+                if not retryable(exc) or attempts[i] >= max_retries:
+                    for pending in in_flight:
+                        pending.cancel()
+                    raise exc
+
+                limit.failure()
+                attempts[i] += 1
+                delay = backoff * (2 ** (attempts[i] - 1)) * (1 + random.random())
+                queue.append((time.time() + delay, i))
+
+    return results
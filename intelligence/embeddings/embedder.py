@@ -1,17 +1,58 @@
 import numpy as np
-from openai import OpenAI
-from config.settings import OPENAI_MODEL_EMBEDDINGS, EMBEDDING_BATCH_SIZE
+from config.settings import EMBEDDING_BATCH_TOKENS
+from intelligence.embeddings.batching import plan_batches
+from intelligence.embeddings.dispatcher import dispatch_batches, isolate_bad_inputs
+from intelligence.embeddings.providers import get_provider
 
-client = OpenAI()
 
+def generate_embeddings(
+    texts,
+    batch_size=None,
+    max_tokens=EMBEDDING_BATCH_TOKENS,
+    progress_callback=None,
+    batch_callback=None,
+    provider=None
+):
+    provider = provider or get_provider()
+    spans = plan_batches(texts, max_tokens=max_tokens, max_items=batch_size)
+    offsets = [start for start, _ in spans]
+    batches = [texts[start:stop] for start, stop in spans]
+    # Without a batch_callback the batches are gathered here; the matrix is
+    # allocated once, when the first batch reveals the dimension.
+    embeddings = None
 
-def generate_embeddings(texts, batch_size=EMBEDDING_BATCH_SIZE):
-    all_embeddings = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        response = client.embeddings.create(
-            model=OPENAI_MODEL_EMBEDDINGS,
-            input=batch
-        )
-        all_embeddings.extend([e.embedding for e in response.data])
-    return np.array(all_embeddings)
+    def on_result(batch_idx, vectors):
+        nonlocal embeddings
+        if isinstance(vectors, np.ndarray):
+            matrix, failed = vectors, []
+        else:
+            # Inputs the provider rejected come back as None; they stay zero
+            # rows and are reported to batch_callback so they are never cached.
+            failed = [j for j, v in enumerate(vectors) if v is None]
+            dim = next(len(v) for v in vectors if v is not None) if len(failed) < len(vectors) else 0
+            matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+            for j, v in enumerate(vectors):
+                if v is not None:
+                    matrix[j] = v
+
+        offset = offsets[batch_idx]
+        if batch_callback:
+            batch_callback(offset, matrix, failed)
+        elif matrix.shape[1]:
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), matrix.shape[1]), dtype=np.float32)
+            embeddings[offset:offset + len(matrix)] = matrix
+
+    dispatch_batches(
+        batches,
+        isolate_bad_inputs(provider.embed, retryable=provider.retryable),
+        retryable=provider.retryable,
+        progress_callback=progress_callback,
+        result_callback=on_result
+    )
+
+    if batch_callback:
+        return None
+    if embeddings is None:
+        return np.zeros((len(texts), 0), dtype=np.float32)
+    return embeddings
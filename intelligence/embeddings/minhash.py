@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from config.settings import NEAR_DUPLICATE_THRESHOLD, MINHASH_PERMUTATIONS, MINHASH_BANDS
+
+SHINGLE_BYTES = 4
+SEPARATOR = 0
+# Shingles are hashed a block at a time under every permutation, so a block
+# stays in cache instead of the whole array streaming once per permutation.
+HASH_BLOCK = 1 << 12
+
+
+def _shingles(texts):
+    # All texts are joined into one byte buffer so shingling is a handful of
+    # array operations instead of a Python loop per comment. Returns the
+    # 4-byte shingles as uint32, document after document, and how many each
+    # document has.
+    joined = "\0".join(texts) + "\0"
+    if joined.count("\0") != len(texts):
+        joined = "\0".join(t.replace("\0", " ") for t in texts) + "\0"
+    data = joined.lower().encode("utf-8")
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == SEPARATOR)
+    # A document of L bytes has L - 3 windows that stop short of its separator.
+    counts = np.maximum(np.diff(ends, prepend=-1) - SHINGLE_BYTES, 0)
+
+    if len(buf) < SHINGLE_BYTES:
+        return np.zeros(0, dtype=np.uint32), counts
+
+    # Every 4-byte window, read in place as a little-endian uint32.
+    windows = np.ndarray((len(buf) - 3,), dtype="<u4", buffer=data, strides=(1,))
+    # Drop windows that straddle a separator.
+    straddles = np.zeros(len(buf), dtype=bool)
+    for offset in range(SHINGLE_BYTES):
+        straddles[np.maximum(ends - offset, 0)] = True
+    return windows[~straddles[:len(windows)]].astype(np.uint32, copy=False), counts
+
+
+def _mix(x):
+    # murmur3 finalizer: spreads byte patterns over all 32 bits so the cheap
+    # per-permutation xor-multiply below behaves like independent hashes.
+    x = x ^ (x >> np.uint32(16))
+    x *= np.uint32(0x85EBCA6B)
+    x ^= x >> np.uint32(13)
+    x *= np.uint32(0xC2B2AE35)
+    x ^= x >> np.uint32(16)
+    return x
+
+
+def signatures(texts, permutations=MINHASH_PERMUTATIONS, seed=42):
+    # (permutations, n) MinHash signatures, permutation-major so each
+    # permutation and each LSH band row is contiguous. Texts too short to
+    # shingle keep max values and are never matched.
+    shingles, counts = _shingles(texts)
+    n = len(texts)
+    sig = np.full((permutations, n), np.iinfo(np.uint32).max, dtype=np.uint32)
+    has_shingles = counts > 0
+    if len(shingles) == 0:
+        return sig, has_shingles
+
+    # Where each shingled document's run of shingles begins.
+    docs = np.flatnonzero(has_shingles)
+    starts = np.r_[0, np.cumsum(counts[docs])[:-1]]
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 2 ** 32, permutations, dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+    b = rng.integers(0, 2 ** 32, permutations, dtype=np.uint64).astype(np.uint32)
+    x = _mix(shingles)
+    # Blocks are cut at document starts so no reduceat segment is split.
+    cuts = starts[np.searchsorted(starts, np.arange(0, len(x), HASH_BLOCK), side="right") - 1]
+    cuts = np.unique(np.r_[cuts, len(x)])
+    segments = np.searchsorted(starts, cuts)
+    hashed = np.empty((permutations, np.diff(cuts).max()), dtype=np.uint32)
+    for lo, hi, first, last in zip(cuts[:-1], cuts[1:], segments[:-1], segments[1:]):
+        block = hashed[:, :hi - lo]
+        np.bitwise_xor(x[None, lo:hi], b[:, None], out=block)
+        np.multiply(block, a[:, None], out=block)
+        sig[:, docs[first:last]] = np.minimum.reduceat(block, starts[first:last] - lo, axis=1)
+
+    return sig, has_shingles
+
+
+def near_duplicate_groups(texts, threshold=NEAR_DUPLICATE_THRESHOLD, permutations=MINHASH_PERMUTATIONS, bands=MINHASH_BANDS):
+    # Group texts whose estimated Jaccard similarity (over byte 4-shingles) is
+    # at least threshold. LSH banding proposes candidates; each is verified
+    # against its bucket leader's full signature before being linked, and
+    # groups are the connected components of the verified links.
+    # Returns group ids numbered by first appearance.
+    n = len(texts)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    sig, has_shingles = signatures(texts, permutations)
+    rows = permutations // bands
+    candidates = np.flatnonzero(has_shingles)
+    sig = sig[:, candidates]
+    src, dst = [], []
+
+    for band in range(bands):
+        # Fold the band's rows into one uint64 key; a rare collision only
+        # adds a candidate that verification then rejects.
+        keys = np.zeros(len(candidates), dtype=np.uint64)
+        for r in range(band * rows, (band + 1) * rows):
+            keys = keys * np.uint64(0x9E3779B97F4A7C15) + sig[r]
+        bucket, uniques = pd.factorize(keys)
+        counts = np.bincount(bucket, minlength=len(uniques))
+        shared = counts[bucket] > 1
+        if not shared.any():
+            continue
+
+        # Positions within candidates; the lowest one leads its bucket.
+        members = np.flatnonzero(shared)
+        bucket = bucket[shared]
+        leader_of_bucket = np.full(len(counts), len(candidates), dtype=np.int64)
+        np.minimum.at(leader_of_bucket, bucket, members)
+        leaders = leader_of_bucket[bucket]
+
+        similarity = (sig[:, members] == sig[:, leaders]).mean(axis=0)
+        linked = (members != leaders) & (similarity >= threshold)
+        src.append(candidates[members[linked]])
+        dst.append(candidates[leaders[linked]])
+
+    if src:
+        src = np.concatenate(src)
+        dst = np.concatenate(dst)
+    else:
+        src = dst = np.zeros(0, dtype=np.int64)
+
+    graph = coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+    _, components = connected_components(graph, directed=False)
+    # Renumber by first appearance so group 0 holds the first text.
+    _, first = np.unique(components, return_index=True)
+    order = np.argsort(first)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank[components]
@@ -0,0 +1,305 @@
+import os
+import base64
+import fcntl
+import pickle
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from openai import OpenAI, APIConnectionError, APITimeoutError
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from config.settings import (
+    EMBEDDING_PROVIDER,
+    OPENAI_MODEL_EMBEDDINGS,
+    OPENAI_EMBEDDING_DIMENSIONS,
+    LOCAL_EMBEDDING_DIM,
+    LOCAL_EMBEDDING_FEATURES,
+    LOCAL_EMBEDDING_FIT_SAMPLE,
+    LOCAL_EMBEDDING_MODEL_PATH,
+    LOCAL_EMBEDDING_MIN_FIT_DOCS,
+    LOCAL_EMBEDDING_REFIT_GROWTH
+)
+from intelligence.embeddings.dispatcher import is_retryable
+
+
+def decode_embeddings(data):
+    # Clients that ignore encoding_format (proxies, test doubles) hand back
+    # float lists, which are copied row by row into the same matrix.
+    if not data:
+        return np.zeros((0, 0), dtype=np.float32)
+    first = data[0].embedding
+    dim = len(base64.b64decode(first)) // 4 if isinstance(first, str) else len(first)
+    matrix = np.empty((len(data), dim), dtype=np.float32)
+    for i, item in enumerate(data):
+        vector = item.embedding
+        if isinstance(vector, str):
+            vector = np.frombuffer(base64.b64decode(vector), dtype="<f4")
+        matrix[i] = vector
+    return matrix
+
+
+class OpenAIEmbeddingProvider:
+    name = "openai"
+
+    def __init__(self, model=OPENAI_MODEL_EMBEDDINGS, dimensions=OPENAI_EMBEDDING_DIMENSIONS, client=None):
+        self.model = model
+        self.dimensions = dimensions or None
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = OpenAI()
+        return self._client
+
+    def embed(self, texts):
+        options = {"dimensions": self.dimensions} if self.dimensions else {}
+        # Asking for base64 explicitly keeps the SDK from expanding every
+        # vector into a list of Python floats; rows decode straight into the
+        # float32 result.
+        response = self.client.embeddings.create(
+            model=self.model,
+            input=texts,
+            encoding_format="base64",
+            **options
+        )
+        return decode_embeddings(response.data)
+
+    def retryable(self, exc):
+        return isinstance(exc, (APIConnectionError, APITimeoutError)) or is_retryable(exc)
+
+
+class LocalEmbeddingProvider:
+    # Hashed word uni/bigrams -> sublinear TF-IDF -> TruncatedSVD projection.
+    # Document frequencies accumulate with partial_fit on every job's texts;
+    # the IDF weights and projection are frozen at each fit and persisted so
+    # vectors stay stable between runs. Until enough documents have been seen
+    # for a useful fit, a fixed random projection of plain TF vectors is used.
+    # Each distinct text is counted once, ever: hashes of counted texts are
+    # persisted with the state, so re-running a job changes nothing, and
+    # workers sharing the file merge their counts under a flock.
+    name = "local"
+    bootstrap_version = "rp42"
+
+    def __init__(
+        self,
+        dim=LOCAL_EMBEDDING_DIM,
+        n_features=LOCAL_EMBEDDING_FEATURES,
+        fit_sample=LOCAL_EMBEDDING_FIT_SAMPLE,
+        path=LOCAL_EMBEDDING_MODEL_PATH,
+        min_fit_docs=LOCAL_EMBEDDING_MIN_FIT_DOCS,
+        refit_growth=LOCAL_EMBEDDING_REFIT_GROWTH
+    ):
+        self.dim = dim
+        self.n_features = n_features
+        self.fit_sample = fit_sample
+        self.path = path
+        self.min_fit_docs = min_fit_docs
+        self.refit_growth = refit_growth
+        self.dimensions = dim
+        self.model = f"hashing-tfidf-svd-{n_features}-{dim}"
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None
+        )
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.fitted_docs = 0
+        self.seen = np.zeros(0, dtype=np.uint64)
+        self.idf = None
+        self.components = None
+        self.fit_version = self.bootstrap_version
+        self._bootstrap = None
+        self._file_id = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _stat(self):
+        # A save always replaces the file, so a new inode means new state.
+        try:
+            st = os.stat(self.path)
+        except (OSError, TypeError):
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    @contextmanager
+    def _file_lock(self):
+        if not self.path:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        file_id = self._stat()
+        if file_id is None or file_id == self._file_id:
+            return
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        self._file_id = file_id
+        if state.get("model") != self.model:
+            return
+        self.doc_freq = state["doc_freq"]
+        self.n_docs = state["n_docs"]
+        self.seen = state.get("seen", np.zeros(0, dtype=np.uint64))
+        fitted_docs = state.get("fitted_docs", self.n_docs)
+        # Projections fitted on too few documents (older files) are dropped.
+        if state.get("components") is not None and fitted_docs >= self.min_fit_docs:
+            self.fitted_docs = fitted_docs
+            self.idf = state.get("idf")
+            if self.idf is None:
+                self.idf = self._idf()
+            self.components = state["components"]
+            self.fit_version = state.get("fit_version") or hashlib.md5(self.components.tobytes()).hexdigest()[:12]
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({
+                "model": self.model,
+                "doc_freq": self.doc_freq,
+                "n_docs": self.n_docs,
+                "fitted_docs": self.fitted_docs,
+                "seen": self.seen,
+                "idf": self.idf,
+                "components": self.components,
+                "fit_version": self.fit_version
+            }, f)
+        os.replace(tmp_path, self.path)
+        self._file_id = self._stat()
+
+    def _idf(self):
+        return (np.log((1 + self.n_docs) / (1 + self.doc_freq)) + 1.0).astype(np.float32)
+
+    def _tfidf(self, texts, idf=None):
+        counts = self.vectorizer.transform(texts).tocsr()
+        counts.data = np.log1p(counts.data)
+        if idf is not None:
+            counts = counts.multiply(idf).tocsr()
+        return normalize(counts)
+
+    def _bootstrap_components(self):
+        # Data-independent, so every process agrees on it without a saved fit.
+        if self._bootstrap is None:
+            rng = np.random.default_rng(42)
+            self._bootstrap = rng.standard_normal((self.n_features, self.dim), dtype=np.float32) / np.sqrt(self.dim)
+        return self._bootstrap
+
+    def partial_fit(self, texts):
+        counts = self.vectorizer.transform(texts).tocsr()
+        counts.data[:] = 1
+        self.doc_freq += np.asarray(counts.sum(axis=0)).ravel().astype(np.int64)
+        self.n_docs += counts.shape[0]
+        return self
+
+    def refit(self, texts):
+        if len(texts) > self.fit_sample:
+            rng = np.random.default_rng(42)
+            texts = [texts[i] for i in rng.choice(len(texts), self.fit_sample, replace=False)]
+
+        idf = self._idf()
+        tfidf = self._tfidf(texts, idf)
+        n_components = max(1, min(self.dim, tfidf.shape[0] - 1, self.n_features - 1))
+        svd = TruncatedSVD(n_components=n_components, random_state=42)
+        svd.fit(tfidf)
+
+        components = np.zeros((self.dim, self.n_features), dtype=np.float32)
+        components[:n_components] = svd.components_
+        self.idf = idf
+        self.components = np.ascontiguousarray(components.T)
+        self.fitted_docs = self.n_docs
+        # Vectors from different fits are not comparable, so each fit gets its
+        # own cache namespace.
+        self.fit_version = hashlib.md5(self.components.tobytes()).hexdigest()[:12]
+        return self
+
+    @property
+    def fitted(self):
+        return self.components is not None
+
+    def needs_refit(self, n_texts):
+        # The fit sample itself must be big enough, not just the history.
+        if n_texts < self.min_fit_docs or self.n_docs < self.min_fit_docs:
+            return False
+        return self.components is None or self.n_docs >= self.refit_growth * self.fitted_docs
+
+    def _unseen(self, hashes):
+        return np.flatnonzero(~np.isin(hashes, self.seen))
+
+    def fit(self, texts):
+        # Called once per job with its distinct texts, before anything is
+        # embedded, so a refit never changes vectors halfway through a job.
+        # Jobs with nothing new neither count nor write anything.
+        texts = [str(t) for t in texts]
+        hashes, first = np.unique(pd.util.hash_array(np.array(texts, dtype=object)), return_index=True)
+        with self._lock:
+            self._load()
+            if not len(self._unseen(hashes)):
+                return self
+            with self._file_lock():
+                # Another worker may have saved since; count on top of its state.
+                self._load()
+                new = self._unseen(hashes)
+                if not len(new):
+                    return self
+                self.partial_fit([texts[i] for i in first[new]])
+                self.seen = np.union1d(self.seen, hashes[new])
+                if self.needs_refit(len(texts)):
+                    self.refit(texts)
+                self.save()
+        return self
+
+    def embed(self, texts):
+        texts = [str(t) for t in texts]
+        with self._lock:
+            idf, components = self.idf, self.components
+        if components is None:
+            components = self._bootstrap_components()
+
+        vectors = np.asarray(self._tfidf(texts, idf) @ components, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def retryable(self, exc):
+        return False
+
+
+PROVIDERS = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+    LocalEmbeddingProvider.name: LocalEmbeddingProvider
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def register_provider(name, factory):
+    PROVIDERS[name] = factory
+
+
+def get_provider(name=None, **options):
+    name = name or EMBEDDING_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider '{name}'. Available: {sorted(PROVIDERS)}")
+
+    key = (name, tuple(sorted(options.items())))
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = PROVIDERS[name](**options)
+        return _instances[key]
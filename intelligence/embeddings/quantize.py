@@ -0,0 +1,105 @@
+import numpy as np
+
+from config.settings import EMBEDDING_STORAGE_DTYPE
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+
+def row_dtype(dtype, dim):
+    # On-disk / in-cache layout of one vector.
+    if dtype == "float32":
+        return np.dtype(("<f4", (dim,)))
+    if dtype == "float16":
+        return np.dtype(("<f2", (dim,)))
+    if dtype == "int8":
+        return np.dtype([("scale", "<f4"), ("codes", "i1", (dim,))])
+    raise ValueError(f"Unsupported embedding storage dtype '{dtype}'. Choose from {STORAGE_DTYPES}")
+
+
+class QuantizedMatrix:
+    # Row-major embedding matrix stored as float16, or int8 codes with one
+    # float32 scale per row (vector ~= codes * scale).
+
+    def __init__(self, codes, scales=None):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def dtype(self):
+        return "int8" if self.scales is not None else str(self.codes.dtype)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        scales = self.scales[rows] if self.scales is not None else None
+        return QuantizedMatrix(self.codes[rows], scales)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.dequantize(dtype=dtype or np.float32)
+
+    def dequantize(self, start=0, stop=None, dtype=np.float32):
+        block = self.codes[start:stop].astype(dtype)
+        if self.scales is not None:
+            block *= self.scales[start:stop, None].astype(dtype)
+        return block
+
+    def chunks(self, chunk_rows=8192):
+        for start in range(0, len(self), chunk_rows):
+            yield start, self.dequantize(start, start + chunk_rows)
+
+    def dot(self, queries):
+        # (n, d) x (q, d)^T, dequantizing one block of rows at a time.
+        queries = np.asarray(queries, dtype=np.float32)
+        scores = np.empty((len(self), len(queries)), dtype=np.float32)
+        for start, block in self.chunks():
+            scores[start:start + len(block)] = block @ queries.T
+        return scores
+
+
+def quantize(matrix, dtype=EMBEDDING_STORAGE_DTYPE):
+    if isinstance(matrix, QuantizedMatrix):
+        matrix = matrix.dequantize()
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype == "float32":
+        return matrix
+    if dtype == "float16":
+        return QuantizedMatrix(matrix.astype(np.float16))
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return QuantizedMatrix(codes, scales.astype(np.float32))
+    raise ValueError(f"Unsupported embedding storage dtype '{dtype}'. Choose from {STORAGE_DTYPES}")
+
+
+def as_float32(matrix, start=0, stop=None):
+    if isinstance(matrix, QuantizedMatrix):
+        return matrix.dequantize(start, stop)
+    return np.asarray(matrix[start:stop], dtype=np.float32)
+
+
+def encode_rows(matrix, dtype=EMBEDDING_STORAGE_DTYPE):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    rows = np.zeros(len(matrix), dtype=row_dtype(dtype, matrix.shape[1]))
+    if dtype == "int8":
+        q = quantize(matrix, "int8")
+        rows["scale"] = q.scales
+        rows["codes"] = q.codes
+    else:
+        rows[:] = matrix
+    return rows
+
+
+def decode_rows(rows, dtype=EMBEDDING_STORAGE_DTYPE):
+    if dtype == "int8":
+        return rows["codes"].astype(np.float32) * rows["scale"][:, None]
+    return np.asarray(rows, dtype=np.float32)
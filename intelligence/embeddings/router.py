@@ -0,0 +1,130 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from config.settings import EMBEDDING_CACHE_TIERS, EMBEDDING_STORE_DIR
+from intelligence.embeddings.cache import LRUEmbeddingCache, RedisEmbeddingCache, TieredEmbeddingCache
+from intelligence.embeddings.embedder import generate_embeddings
+from intelligence.embeddings.providers import get_provider
+from intelligence.embeddings.store import EmbeddingStore
+from utils.hashing import namespaced_hash
+from utils.redis_client import get_redis
+
+# Bump whenever the text handed to providers is preprocessed differently, so
+# vectors cached under the old rules are no longer served.
+EMBEDDING_NORMALIZATION_VERSION = 1
+
+# Process-wide tiers, shared by every job that runs in this process. Keys are
+# namespaced, so one memory tier can safely serve several models.
+memory_cache = LRUEmbeddingCache()
+_stores = {}
+
+
+def cache_namespace(provider):
+    parts = [
+        getattr(provider, "name", type(provider).__name__),
+        getattr(provider, "model", "default"),
+        str(getattr(provider, "dimensions", None) or "native"),
+        f"norm{EMBEDDING_NORMALIZATION_VERSION}"
+    ]
+    fit_version = getattr(provider, "fit_version", None)
+    if fit_version:
+        parts.append(fit_version)
+    return ":".join(parts)
+
+
+def _slug(namespace):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", namespace)
+
+
+def _disk_store(namespace):
+    if namespace not in _stores:
+        _stores[namespace] = EmbeddingStore(os.path.join(EMBEDDING_STORE_DIR, _slug(namespace)))
+    return _stores[namespace]
+
+
+def _redis_cache(namespace):
+    return RedisEmbeddingCache(get_redis(), prefix=f"embed:{_slug(namespace)}")
+
+
+def build_cache(tiers=EMBEDDING_CACHE_TIERS, namespace="default"):
+    factories = {
+        "memory": lambda: memory_cache,
+        "disk": lambda: _disk_store(namespace),
+        "redis": lambda: _redis_cache(namespace)
+    }
+    unknown = [t for t in tiers if t not in factories]
+    if unknown:
+        raise ValueError(f"Unknown embedding cache tier(s) {unknown}. Available: {sorted(factories)}")
+    return TieredEmbeddingCache([factories[t]() for t in tiers])
+
+
+def embed(texts, progress_callback=None, stats_callback=None, batch_size=None, provider=None, cache=None, tiers=None):
+    # Single entry point for embeddings: exact-duplicate collapse, cache
+    # lookup, token-budgeted concurrent dispatch for misses, per-batch cache
+    # writes and progress reporting. Returns a float32 matrix aligned with texts;
+    # rows the provider rejected are zero and listed in the stats as "failed".
+    texts = [str(t) for t in texts]
+    inverse, unique_texts = pd.factorize(pd.Series(texts, dtype="object"), sort=False)
+    unique_texts = list(unique_texts)
+
+    provider = provider or get_provider()
+    if hasattr(provider, "fit"):
+        # Fitted providers learn from texts they have not counted before and
+        # version their vectors; fit first so the namespace names the
+        # projection the vectors will come from. A repeat job is a no-op.
+        provider.fit(unique_texts)
+    namespace = cache_namespace(provider)
+    cache = cache or build_cache(tiers or EMBEDDING_CACHE_TIERS, namespace)
+    hashes = [namespaced_hash(namespace, t) for t in unique_texts]
+
+    cached, found = cache.get_many(hashes)
+    missing = np.flatnonzero(~found)
+    vectors = cached
+    failed_unique = []
+
+    def on_batch(offset, batch_vectors, failed):
+        # Rejected inputs are neither stored nor cached; a batch where every
+        # input was rejected carries no vectors at all (zero columns).
+        nonlocal vectors
+        batch_rows = missing[offset:offset + len(batch_vectors)]
+        failed_unique.extend(batch_rows[failed].tolist())
+        keep = np.setdiff1d(np.arange(len(batch_rows)), failed)
+        if not len(keep):
+            return
+        if vectors is None:
+            vectors = np.zeros((len(unique_texts), batch_vectors.shape[1]), dtype=np.float32)
+        vectors[batch_rows[keep]] = batch_vectors[keep]
+        cache.set_many([hashes[i] for i in batch_rows[keep]], batch_vectors[keep])
+
+    if len(missing):
+        generate_embeddings(
+            [unique_texts[i] for i in missing],
+            batch_size=batch_size,
+            progress_callback=progress_callback,
+            batch_callback=on_batch,
+            provider=provider
+        )
+    elif progress_callback:
+        progress_callback(1, 1, 0)
+
+    if stats_callback:
+        stats_callback({
+            **cache.stats,
+            "namespace": namespace,
+            "texts": len(texts),
+            "unique": len(unique_texts),
+            "embedded": int(len(missing)),
+            # Positions in texts whose vectors are zero because the provider
+            # rejected them.
+            "failed": np.flatnonzero(np.isin(inverse, failed_unique)).tolist()
+        })
+
+    if vectors is None:
+        return np.zeros((len(texts), 0), dtype=np.float32)
+    if len(unique_texts) == len(texts):
+        # No duplicates: inverse is the identity, so skip the gather copy.
+        return vectors
+    return vectors[inverse]
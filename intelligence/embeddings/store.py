@@ -0,0 +1,351 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import argparse
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from config.settings import (
+    EMBEDDING_STORE_DIR,
+    EMBEDDING_STORAGE_DTYPE,
+    EMBEDDING_STORE_MAX_BYTES,
+    EMBEDDING_CACHE_EVICTION
+)
+from intelligence.embeddings.quantize import row_dtype, encode_rows, decode_rows
+
+KEY_BYTES = 16
+ACCESS_DTYPE = np.dtype([("hits", "<u4"), ("last", "<u4")])
+EVICTION_POLICIES = ("lru", "lfu")
+# Compact down to this fraction of the budget so eviction isn't rerun on
+# every append once the store is full.
+LOW_WATERMARK = 0.8
+
+
+def key_bytes(h):
+    return bytes.fromhex(h)
+
+
+class EmbeddingStore:
+    # Layout: vectors.bin holds the encoded rows (float32, float16 or int8 +
+    # scale) back to back, index.bin holds one 16-byte md5 digest per row in
+    # the same order. Both files are only appended to, under an exclusive
+    # flock, and the matrix is always written before the index so every
+    # indexed row is present on disk. access.bin keeps approximate per-row
+    # hit counts and last-access times for eviction; compaction rewrites all
+    # three files and swaps them in, which readers detect by inode. Readers
+    # map the files under a shared flock, so they never see one swapped and
+    # not the other. One instance may be shared by threads (the router keeps
+    # one per namespace); its in-memory view is guarded by a lock.
+    name = "disk"
+
+    def __init__(
+        self,
+        path=EMBEDDING_STORE_DIR,
+        dtype=EMBEDDING_STORAGE_DTYPE,
+        max_bytes=EMBEDDING_STORE_MAX_BYTES,
+        policy=EMBEDDING_CACHE_EVICTION
+    ):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{policy}'. Choose from {EVICTION_POLICIES}")
+        self.path = path
+        self.dtype = dtype
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.matrix_path = os.path.join(path, "vectors.bin")
+        self.index_path = os.path.join(path, "index.bin")
+        self.access_path = os.path.join(path, "access.bin")
+        self.meta_path = os.path.join(path, "meta.json")
+        self.lock_path = os.path.join(path, ".lock")
+        self.dim = None
+        self._mutex = threading.RLock()
+        self._reset()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _reset(self):
+        self._rows = {}
+        self._n_rows = 0
+        self._inode = None
+        self._matrix = None
+        self._access = None
+
+    def __len__(self):
+        with self._mutex:
+            self._refresh()
+            return self._n_rows
+
+    @property
+    def row_bytes(self):
+        return row_dtype(self.dtype, self.dim).itemsize + KEY_BYTES + ACCESS_DTYPE.itemsize
+
+    @property
+    def nbytes(self):
+        with self._mutex:
+            self._refresh()
+            return self._n_rows * self.row_bytes if self.dim else 0
+
+    @contextmanager
+    def _lock(self, mode=fcntl.LOCK_EX):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_meta(self):
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            # The first writer fixes the layout for everyone sharing the store.
+            self.dim = int(meta["dim"])
+            self.dtype = meta.get("dtype", "float32")
+
+    def _row_layout(self):
+        layout = row_dtype(self.dtype, self.dim)
+        if layout.subdtype is not None:
+            return layout.subdtype[0], (self.dim,)
+        return layout, ()
+
+    def _refresh(self):
+        with self._mutex:
+            self._load_meta()
+            if self.dim is None or not os.path.exists(self.index_path):
+                return
+            # Shared: compaction, which swaps files, holds the lock exclusively.
+            with self._lock(fcntl.LOCK_SH):
+                self._sync()
+
+    def _sync(self):
+        # Callers hold the mutex and a shared or exclusive flock.
+        self._load_meta()
+        if self.dim is None or not os.path.exists(self.index_path):
+            return
+
+        stat = os.stat(self.index_path)
+        if self._inode is not None and stat.st_ino != self._inode:
+            # Another process compacted the store; row numbers changed.
+            self._reset()
+        self._inode = stat.st_ino
+
+        n_rows = stat.st_size // KEY_BYTES
+        if n_rows <= self._n_rows:
+            return
+
+        with open(self.index_path, "rb") as f:
+            f.seek(self._n_rows * KEY_BYTES)
+            raw = f.read((n_rows - self._n_rows) * KEY_BYTES)
+
+        for i in range(n_rows - self._n_rows):
+            # First writer wins if two processes raced on the same text.
+            self._rows.setdefault(raw[i * KEY_BYTES:(i + 1) * KEY_BYTES], self._n_rows + i)
+
+        self._n_rows = n_rows
+        base, tail = self._row_layout()
+        self._matrix = np.memmap(
+            self.matrix_path,
+            dtype=base,
+            mode="r",
+            shape=(n_rows,) + tail
+        )
+
+        n_access = 0
+        if os.path.exists(self.access_path):
+            n_access = min(os.path.getsize(self.access_path) // ACCESS_DTYPE.itemsize, n_rows)
+        self._access = np.memmap(
+            self.access_path,
+            dtype=ACCESS_DTYPE,
+            mode="r+",
+            shape=(n_access,)
+        ) if n_access else None
+
+    def _touch(self, rows):
+        # Unlocked read-modify-write: concurrent hits may be undercounted,
+        # which is fine for an eviction heuristic.
+        if self._access is None:
+            return
+        rows = rows[rows < len(self._access)]
+        np.add.at(self._access["hits"], rows, 1)
+        self._access["last"][rows] = int(time.time())
+
+    def get_many(self, hashes):
+        with self._mutex:
+            return self._get_many(hashes)
+
+    def _get_many(self, hashes):
+        self._refresh()
+        found = np.zeros(len(hashes), dtype=bool)
+        if self._matrix is None:
+            self.stats["misses"] += len(hashes)
+            return None, found
+
+        rows = np.empty(len(hashes), dtype=np.int64)
+        for i, h in enumerate(hashes):
+            row = self._rows.get(key_bytes(h))
+            if row is not None:
+                rows[i] = row
+                found[i] = True
+
+        vectors = np.zeros((len(hashes), self.dim), dtype=np.float32)
+        if found.any():
+            vectors[found] = decode_rows(self._matrix[rows[found]], self.dtype)
+            self._touch(rows[found])
+
+        hits = int(found.sum())
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(hashes) - hits
+        return vectors, found
+
+    def put_many(self, hashes, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(hashes) == 0:
+            return 0
+        if vectors.ndim != 2 or len(vectors) != len(hashes):
+            raise ValueError("vectors must be a (len(hashes), dim) matrix")
+
+        with self._mutex, self._lock():
+            self._load_meta()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, "w") as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding store at {self.path} holds {self.dim}-dim vectors, got {vectors.shape[1]}")
+
+            self._sync()
+
+            keep = []
+            seen = set()
+            for i, h in enumerate(hashes):
+                k = key_bytes(h)
+                if k not in self._rows and k not in seen:
+                    seen.add(k)
+                    keep.append(i)
+            if not keep:
+                return 0
+
+            # Drop any tail left behind by a writer that died mid-append.
+            row_bytes = row_dtype(self.dtype, self.dim).itemsize
+            with open(self.matrix_path, "ab") as f:
+                f.truncate(self._n_rows * row_bytes)
+                f.write(encode_rows(vectors[keep], self.dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(self.access_path, "ab") as f:
+                f.truncate(self._n_rows * ACCESS_DTYPE.itemsize)
+                access = np.zeros(len(keep), dtype=ACCESS_DTYPE)
+                access["last"] = int(time.time())
+                f.write(access.tobytes())
+
+            with open(self.index_path, "ab") as f:
+                f.truncate(self._n_rows * KEY_BYTES)
+                f.write(b"".join(key_bytes(hashes[i]) for i in keep))
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._sync()
+            if self.max_bytes and self._n_rows * self.row_bytes > self.max_bytes:
+                self._compact(int(self.max_bytes * LOW_WATERMARK), self.policy)
+
+            self.stats["writes"] += len(keep)
+        return len(keep)
+
+    def set_many(self, hashes, vectors):
+        self.put_many(hashes, vectors)
+
+    def compact(self, max_bytes=None, policy=None):
+        with self._mutex, self._lock():
+            self._sync()
+            return self._compact(self.max_bytes if max_bytes is None else max_bytes, policy or self.policy)
+
+    def _compact(self, max_bytes, policy):
+        if self._matrix is None:
+            return 0
+
+        n_rows = self._n_rows
+        access = np.zeros(n_rows, dtype=ACCESS_DTYPE)
+        if self._access is not None:
+            access[:len(self._access)] = self._access
+
+        # Keys that lost a write race sit behind their first copy; drop them.
+        live = np.zeros(n_rows, dtype=bool)
+        live[list(self._rows.values())] = True
+
+        hits = access["hits"].astype(np.int64)
+        last = access["last"].astype(np.int64)
+        if policy == "lfu":
+            order = np.lexsort((-last, -hits))
+        else:
+            order = np.lexsort((-hits, -last))
+        order = order[live[order]]
+        if max_bytes:
+            order = order[:max_bytes // self.row_bytes]
+        keep = np.sort(order)
+
+        with open(self.index_path, "rb") as f:
+            keys = np.frombuffer(f.read(n_rows * KEY_BYTES), dtype=f"S{KEY_BYTES}")
+
+        suffix = f".{os.getpid()}.tmp"
+        np.ascontiguousarray(self._matrix[keep]).tofile(self.matrix_path + suffix)
+        access[keep].tofile(self.access_path + suffix)
+        keys[keep].tofile(self.index_path + suffix)
+
+        # Readers are held off by the exclusive flock until all three are in.
+        os.replace(self.matrix_path + suffix, self.matrix_path)
+        os.replace(self.access_path + suffix, self.access_path)
+        os.replace(self.index_path + suffix, self.index_path)
+
+        evicted = int(n_rows - len(keep))
+        self.stats["evictions"] += evicted
+        self._reset()
+        self._sync()
+        return evicted
+
+    def describe(self):
+        with self._mutex:
+            return self._describe()
+
+    def _describe(self):
+        self._refresh()
+        hits = np.asarray(self._access["hits"]) if self._access is not None else np.zeros(0)
+        return {
+            "path": self.path,
+            "rows": self._n_rows,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "bytes": self.nbytes,
+            "never_hit": int((hits == 0).sum()),
+            "median_hits": float(np.median(hits)) if len(hits) else 0.0,
+            "max_hits": int(hits.max()) if len(hits) else 0
+        }
+
+
+def namespace_dirs(root=EMBEDDING_STORE_DIR):
+    for dirpath, _, filenames in os.walk(root):
+        if "meta.json" in filenames:
+            yield dirpath
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or compact on-disk embedding stores")
+    parser.add_argument("command", choices=["stats", "compact"])
+    parser.add_argument("--root", default=EMBEDDING_STORE_DIR)
+    parser.add_argument("--max-bytes", type=int, default=EMBEDDING_STORE_MAX_BYTES, help="per-namespace budget; 0 only drops duplicate rows")
+    parser.add_argument("--policy", choices=EVICTION_POLICIES, default=EMBEDDING_CACHE_EVICTION)
+    args = parser.parse_args(argv)
+
+    for path in namespace_dirs(args.root):
+        store = EmbeddingStore(path, policy=args.policy)
+        if args.command == "compact":
+            evicted = store.compact(max_bytes=args.max_bytes)
+            print(f"{os.path.relpath(path, args.root)}: evicted {evicted} rows")
+        print(json.dumps({**store.describe(), "path": os.path.relpath(path, args.root)}))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
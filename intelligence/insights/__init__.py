@@ -1,3 +1,3 @@
-from .insight_generator import generate_cluster_insight
+from .insight_generator import generate_cluster_insight, generate_insights
 
-__all__ = ["generate_cluster_insight"]
+__all__ = ["generate_cluster_insight", "generate_insights"]
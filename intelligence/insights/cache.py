@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import redis
+
+from config.settings import INSIGHT_CACHE, INSIGHT_CACHE_DIR, INSIGHT_CACHE_TTL
+from utils.hashing import text_hash
+from utils.redis_client import get_redis
+
+INSIGHT_CACHE_BACKENDS = ("disk", "redis", "none")
+
+
+def insight_fingerprint(texts, model, prompt_version, stats=None):
+    # Order-insensitive over the cluster's comments, so the same cluster
+    # found again under another id or order reuses its insight. Sampled
+    # comments are dicts and hash with their counts and likes.
+    digest = hashlib.md5(f"{model}\n{prompt_version}\n".encode("utf-8"))
+    for h in sorted(text_hash(t if isinstance(t, str) else json.dumps(t, sort_keys=True)) for t in texts):
+        digest.update(h.encode("ascii"))
+    if stats:
+        digest.update(json.dumps(stats, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class DiskInsightCache:
+    # One small JSON file per fingerprint, fanned out by prefix. Expiry is
+    # judged by file mtime, so nothing needs sweeping for the cache to work.
+    name = "disk"
+
+    def __init__(self, path=INSIGHT_CACHE_DIR, ttl=INSIGHT_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl or None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    def _path(self, key):
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def get_many(self, keys):
+        insights = []
+        now = time.time()
+        for key in keys:
+            path = self._path(key)
+            try:
+                if self.ttl and now - os.path.getmtime(path) > self.ttl:
+                    insights.append(None)
+                    continue
+                with open(path) as f:
+                    insights.append(json.load(f))
+            except (OSError, ValueError):
+                insights.append(None)
+        hits = sum(i is not None for i in insights)
+        self._count("hits", hits)
+        self._count("misses", len(keys) - hits)
+        return insights
+
+    def set_many(self, keys, insights):
+        for key, insight in zip(keys, insights):
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(insight, f)
+            os.replace(tmp_path, path)
+        self._count("writes", len(keys))
+
+
+class RedisInsightCache:
+    # A cache outage only costs LLM calls; lookups fall back to misses and
+    # writes are dropped.
+    name = "redis"
+
+    def __init__(self, client, prefix="insight", ttl=INSIGHT_CACHE_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl or None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0}
+
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        try:
+            values = self.client.mget([self._key(k) for k in keys])
+        except redis.RedisError:
+            self._count("errors")
+            values = [None] * len(keys)
+        insights = [json.loads(v) if v is not None else None for v in values]
+        hits = sum(i is not None for i in insights)
+        self._count("hits", hits)
+        self._count("misses", len(keys) - hits)
+        return insights
+
+    def set_many(self, keys, insights):
+        if not keys:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, insight in zip(keys, insights):
+                pipe.set(self._key(key), json.dumps(insight), ex=self.ttl)
+            pipe.execute()
+        except redis.RedisError:
+            self._count("errors")
+            return
+        self._count("writes", len(keys))
+
+
+_caches = {}
+
+
+def get_insight_cache(backend=None):
+    backend = backend or INSIGHT_CACHE
+    if backend not in INSIGHT_CACHE_BACKENDS:
+        raise ValueError(f"Unknown insight cache '{backend}'. Choose from {INSIGHT_CACHE_BACKENDS}")
+    if backend == "none":
+        return None
+    if backend not in _caches:
+        if backend == "redis":
+            _caches[backend] = RedisInsightCache(get_redis())
+        else:
+            _caches[backend] = DiskInsightCache()
+    return _caches[backend]
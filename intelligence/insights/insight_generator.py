@@ -1,49 +1,308 @@
-from openai import OpenAI
-from config.settings import OPENAI_MODEL_INSIGHTS
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI, APIConnectionError, APITimeoutError
+from config.settings import (
+    OPENAI_MODEL_INSIGHTS,
+    INSIGHT_MAX_IN_FLIGHT,
+    INSIGHT_TIMEOUT,
+    INSIGHT_MAX_RETRIES,
+    INSIGHT_RETRY_BACKOFF,
+    INSIGHT_BATCH_CLUSTERS,
+    INSIGHT_BATCH_TOKENS
+)
+from intelligence.embeddings.batching import plan_batches
+from intelligence.embeddings.dispatcher import is_retryable
+from intelligence.insights.cache import insight_fingerprint
+
+# Bump whenever the prompt or the expected output changes, so insights
+# cached under the old prompt are no longer served.
+INSIGHT_PROMPT_VERSION = 2
+
+CLASSIFICATIONS = ("Request", "Confusion", "Praise", "Skepticism", "Noise")
+INSIGHT_FIELDS = ("theme", "classification", "insight", "suggested_action", "risk_flag")
+
+OUTPUT_SPEC = """- theme (short phrase)
+- classification (choose exactly ONE from: Request, Confusion, Praise, Skepticism, Noise)
+- insight (strategic meaning)
+- suggested_action (specific creator action)
+- risk_flag (or "None")"""
 
 client = OpenAI()
 
 
-def generate_cluster_insight(cluster_comments):
-    prompt = f"""
-You are an AI product analyst for TikTok creators.
+def _format_comment(comment):
+    # Plain strings, or sampled comments from select_prompt_sample.
+    if isinstance(comment, str):
+        return f"- {comment}"
+    tags = []
+    if comment.get("count", 1) > 1:
+        tags.append(f"x{comment['count']}")
+    if comment.get("likes"):
+        tags.append(f"{comment['likes']:.0f} likes")
+    return f"- [{', '.join(tags)}] {comment['text']}" if tags else f"- {comment['text']}"
+
+
+def _format_stats(stats):
+    lines = [f"- comments: {stats['comments']}"]
+    if "share_pct" in stats:
+        lines[0] += f" ({stats['share_pct']}% of all comments)"
+    if "distinct_comments" in stats:
+        lines.append(f"- distinct comments: {stats['distinct_comments']}")
+    if "avg_likes" in stats:
+        lines.append(f"- average likes: {stats['avg_likes']}")
+    if "avg_sentiment" in stats:
+        lines.append(f"- average sentiment: {stats['avg_sentiment']} (-1 negative to 1 positive)")
+    return "\n".join(lines)
+
+
+def _cluster_context(cluster_comments, stats=None):
+    comments = "\n".join(_format_comment(c) for c in cluster_comments)
+    if not stats:
+        return f"""Given these comments:
+
+{comments}"""
+    liked = "most liked" if any(isinstance(c, dict) and "likes" in c for c in cluster_comments) else "most repeated"
+    return f"""Exact statistics for the whole cluster:
 
-Given these comments:
+{_format_stats(stats)}
 
-{cluster_comments}
+A representative sample of its comments (central, {liked} and outlying;
+xN marks repeats):
+
+{comments}"""
+
+
+def build_insight_prompt(cluster_comments, stats=None):
+    return f"""
+You are an AI product analyst for TikTok creators.
+
+{_cluster_context(cluster_comments, stats)}
 
 Return ONLY a valid JSON object with:
-- theme (short phrase)
-- classification (choose exactly ONE from: Request, Confusion, Praise, Skepticism, Noise)
-- insight (strategic meaning)
-- suggested_action (specific creator action)
-- risk_flag (or "None")
+{OUTPUT_SPEC}
 
 Return strictly one JSON object. No markdown. No explanation.
 """
 
+
+def build_batch_prompt(clusters):
+    # clusters: (cluster_id, comments, stats) triples.
+    sections = "\n\n".join(
+        f"### cluster_id: {cluster_id}\n\n{_cluster_context(comments, stats)}"
+        for cluster_id, comments, stats in clusters
+    )
+    return f"""
+You are an AI product analyst for TikTok creators.
+
+Analyse each of the following {len(clusters)} comment clusters independently.
+
+{sections}
+
+Return ONLY a valid JSON array with one object per cluster, each with:
+- cluster_id (exactly as given above)
+{OUTPUT_SPEC}
+
+Return strictly one JSON array. No markdown. No explanation.
+"""
+
+
+def _decode_json(content, opener):
+    # First JSON value starting at opener; tolerates prose or code fences
+    # around it.
+    start = content.find(opener)
+    if start < 0:
+        raise ValueError(f"No JSON {'object' if opener == '{' else 'array'} in model output")
+    value, _ = json.JSONDecoder().raw_decode(content[start:])
+    return value
+
+
+def validate_insight(value):
+    if not isinstance(value, dict):
+        raise ValueError("Insight is not a JSON object")
+    insight = dict(value)
+    insight.setdefault("risk_flag", "None")
+    missing = [f for f in INSIGHT_FIELDS if not isinstance(insight.get(f), str) or not insight[f].strip()]
+    if missing:
+        raise ValueError(f"Insight is missing {missing}")
+    classification = {c.lower(): c for c in CLASSIFICATIONS}.get(insight["classification"].strip().lower())
+    if classification is None:
+        raise ValueError(f"Unknown classification '{insight['classification']}'")
+    insight["classification"] = classification
+    return insight
+
+
+def parse_insight(content):
+    return validate_insight(_decode_json(content, "{"))
+
+
+def parse_batch(content, cluster_ids):
+    # Valid insights by cluster_id; entries that are malformed, duplicated or
+    # for unknown ids are left out so the caller can retry those clusters.
+    values = _decode_json(content, "[")
+    if not isinstance(values, list):
+        raise ValueError("Batch output is not a JSON array")
+    expected = {str(c): c for c in cluster_ids}
+    parsed = {}
+    for value in values:
+        if not isinstance(value, dict) or str(value.get("cluster_id")) not in expected:
+            continue
+        cluster_id = expected[str(value["cluster_id"])]
+        try:
+            insight = validate_insight({k: v for k, v in value.items() if k != "cluster_id"})
+        except ValueError:
+            continue
+        if cluster_id in parsed:
+            # Two answers for one cluster: trust neither.
+            parsed[cluster_id] = None
+            continue
+        parsed[cluster_id] = insight
+    return {c: insight for c, insight in parsed.items() if insight is not None}
+
+
+def _complete(prompt):
     response = client.chat.completions.create(
         model=OPENAI_MODEL_INSIGHTS,
         messages=[{"role": "user", "content": prompt}],
-        temperature=0.2
+        temperature=0.2,
+        timeout=INSIGHT_TIMEOUT
     )
+    return response.choices[0].message.content.strip()
+
+
+def generate_cluster_insight(cluster_comments, stats=None):
+    return parse_insight(_complete(build_insight_prompt(cluster_comments, stats)))
+
+
+def generate_batch_insights(clusters):
+    # clusters: (cluster_id, comments, stats) triples -> {cluster_id: insight}
+    # for every cluster whose part of the answer was valid.
+    return parse_batch(_complete(build_batch_prompt(clusters)), [c[0] for c in clusters])
+
+
+def retryable(exc):
+    # Malformed JSON is worth another sample as well as transient API errors.
+    return isinstance(exc, (APIConnectionError, APITimeoutError, ValueError)) or is_retryable(exc)
+
+
+def failed_insight(exc):
+    return {
+        "theme": "Insight unavailable",
+        "classification": "Noise",
+        "insight": "The model did not return an insight for this cluster.",
+        "suggested_action": "Re-run the analysis",
+        "risk_flag": "None",
+        "error": f"{type(exc).__name__}: {exc}"
+    }
+
+
+def _with_retries(fn, args, max_retries, backoff, should_retry=retryable):
+    # (result, None) on success, (None, last exception) once retries run out.
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(*args), None
+        except Exception as exc:
+            if attempt == max_retries or not should_retry(exc):
+                return None, exc
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+
+def generate_insights(
+    cluster_texts,
+    generate=generate_cluster_insight,
+    max_in_flight=INSIGHT_MAX_IN_FLIGHT,
+    max_retries=INSIGHT_MAX_RETRIES,
+    backoff=INSIGHT_RETRY_BACKOFF,
+    progress_callback=None,
+    cache=None,
+    stats_callback=None,
+    cluster_stats=None,
+    cluster_ids=None,
+    generate_batch=generate_batch_insights,
+    batch_clusters=INSIGHT_BATCH_CLUSTERS,
+    batch_tokens=INSIGHT_BATCH_TOKENS
+):
+    # One insight per entry of cluster_texts, in the same order; cluster_stats
+    # optionally gives each cluster's aggregate numbers for its prompt. Clusters
+    # whose comments were seen before come from cache. The rest are packed
+    # into requests of up to batch_clusters clusters / batch_tokens prompt
+    # tokens, at most max_in_flight at once; clusters a batch answer leaves
+    # out or garbles are asked again on their own, and a cluster that still
+    # fails after its retries gets failed_insight() rather than failing the job.
+    cluster_stats = cluster_stats or [None] * len(cluster_texts)
+    cluster_ids = list(range(len(cluster_texts))) if cluster_ids is None else list(cluster_ids)
+    insights = [None] * len(cluster_texts)
+    keys = [
+        insight_fingerprint(texts, OPENAI_MODEL_INSIGHTS, INSIGHT_PROMPT_VERSION, stats)
+        for texts, stats in zip(cluster_texts, cluster_stats)
+    ]
+    if cache is not None:
+        insights = cache.get_many(keys)
+    missing = [i for i, insight in enumerate(insights) if insight is None]
+
+    sections = [_cluster_context(cluster_texts[i], cluster_stats[i]) for i in missing]
+    batches = [
+        missing[start:stop]
+        for start, stop in plan_batches(sections, max_tokens=batch_tokens, max_items=max(1, batch_clusters))
+    ]
+    counters = {"done": 0, "requests": 0}
+    counters_lock = threading.Lock()
+    start = time.time()
 
-    content = response.choices[0].message.content.strip()
+    def count(name, n=1):
+        with counters_lock:
+            counters[name] += n
+            if name == "done" and progress_callback:
+                done = counters["done"]
+                elapsed = time.time() - start
+                eta_seconds = elapsed / done * (len(missing) - done)
+                progress_callback(done, len(missing), eta_seconds)
 
-    start = content.find("{")
-    brace_count = 0
-    json_str = ""
+    def single(i):
+        insight, exc = _with_retries(generate, (cluster_texts[i], cluster_stats[i]), max_retries, backoff)
+        count("requests")
+        return insight if exc is None else failed_insight(exc)
 
-    for char in content[start:]:
-        if char == "{":
-            brace_count += 1
-        if char == "}":
-            brace_count -= 1
+    def call(batch):
+        results = {}
+        if len(batch) > 1:
+            triples = [(cluster_ids[i], cluster_texts[i], cluster_stats[i]) for i in batch]
+            # Only transient API errors repeat the whole batch; a garbled
+            # answer goes straight to per-cluster requests.
+            answered, _ = _with_retries(
+                generate_batch, (triples,), max_retries, backoff,
+                should_retry=lambda exc: not isinstance(exc, ValueError) and retryable(exc)
+            )
+            count("requests")
+            answered = answered or {}
+            results = {i: answered[cluster_ids[i]] for i in batch if cluster_ids[i] in answered}
+        for i in batch:
+            if i not in results:
+                results[i] = single(i)
+            count("done")
+        return results
 
-        json_str += char
+    if batches:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(batches)))) as pool:
+            for results in pool.map(call, batches):
+                for i, insight in results.items():
+                    insights[i] = insight
 
-        if brace_count == 0 and json_str.strip():
-            break
+    # Failures are never cached, so the next run asks again.
+    fresh = [i for i in missing if "error" not in insights[i]]
+    if cache is not None and fresh:
+        cache.set_many([keys[i] for i in fresh], [insights[i] for i in fresh])
 
-    import json
-    return json.loads(json_str)
+    if stats_callback:
+        stats_callback({
+            "cache": cache.name if cache is not None else "none",
+            "clusters": len(cluster_texts),
+            "hits": len(cluster_texts) - len(missing),
+            "requested": len(missing),
+            "requests": counters["requests"],
+            "failed": len(missing) - len(fresh)
+        })
+    return insights
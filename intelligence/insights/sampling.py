@@ -0,0 +1,106 @@
+import numpy as np
+
+from config.settings import INSIGHT_PROMPT_TOKENS, INSIGHT_COMMENT_CHARS, INSIGHT_MMR_POOL, INSIGHT_MMR_LAMBDA
+from intelligence.embeddings.batching import estimate_tokens
+from intelligence.embeddings.dedup import deduplicate
+from intelligence.embeddings.quantize import as_float32
+
+# Tokens per sampled line on top of the comment itself ("- [x3, 12 likes] ").
+LINE_OVERHEAD = 8
+KINDS = ("central", "liked", "divergent")
+# Consecutive comments too long for the remaining budget before giving up.
+MAX_SKIPS = 12
+
+
+def _unit(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def _truncate(text, max_chars):
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+
+def select_prompt_sample(
+    texts,
+    embeddings,
+    likes=None,
+    token_budget=INSIGHT_PROMPT_TOKENS,
+    max_chars=INSIGHT_COMMENT_CHARS,
+    pool=INSIGHT_MMR_POOL,
+    mmr_lambda=INSIGHT_MMR_LAMBDA
+):
+    # Pick what one cluster's prompt shows, within token_budget whatever the
+    # cluster size. Distinct comments are taken round-robin from three
+    # rankings: nearest the centroid, most liked, and far-out ones chosen by
+    # max-marginal-relevance so they don't repeat each other or the rest.
+    # texts/embeddings/likes are the cluster's rows. Without likes the "liked"
+    # ranking falls back to how often a comment repeats, and sampled comments
+    # carry no like counts.
+    unique_texts, inverse, counts = deduplicate(texts)
+    n = len(unique_texts)
+    if n == 0:
+        return []
+    first = np.full(n, len(inverse), dtype=np.int64)
+    np.minimum.at(first, inverse, np.arange(len(inverse)))
+
+    vectors = _unit(np.array(as_float32(embeddings[first]), dtype=np.float32))
+    centroid = counts @ vectors
+    centroid /= max(np.linalg.norm(centroid), 1e-12)
+    centrality = vectors @ centroid
+    like_sum = np.bincount(inverse, weights=likes, minlength=n) if likes is not None else counts.astype(float)
+
+    # MMR runs over a fixed-size pool so its cost doesn't grow with the cluster.
+    candidates = np.arange(n)
+    if n > pool:
+        candidates = np.sort(np.random.default_rng(42).choice(n, pool, replace=False))
+    pool_vectors = vectors[candidates]
+    max_similarity = np.full(len(candidates), -1.0, dtype=np.float32)
+    picked = np.zeros(n, dtype=bool)
+    chosen = []
+    seen_by_mmr = [0]
+
+    def divergent():
+        while True:
+            for i in chosen[seen_by_mmr[0]:]:
+                np.maximum(max_similarity, pool_vectors @ vectors[i], out=max_similarity)
+            seen_by_mmr[0] = len(chosen)
+            score = mmr_lambda * (1 - centrality[candidates]) - (1 - mmr_lambda) * np.maximum(max_similarity, 0)
+            score[picked[candidates]] = -np.inf
+            best = int(np.argmax(score))
+            if score[best] == -np.inf:
+                return
+            yield int(candidates[best])
+
+    rankings = {
+        "central": iter(np.argsort(-centrality, kind="stable")),
+        "liked": iter(np.argsort(-like_sum, kind="stable")),
+        "divergent": divergent()
+    }
+    remaining = token_budget
+    skips = 0
+    sample = []
+    while rankings and remaining > LINE_OVERHEAD and skips < MAX_SKIPS:
+        for kind in KINDS:
+            if kind not in rankings:
+                continue
+            i = next((int(i) for i in rankings[kind] if not picked[i]), None)
+            if i is None:
+                del rankings[kind]
+                continue
+            # Too long for what is left: skip it, a shorter one may still fit.
+            text = _truncate(unique_texts[i], max_chars)
+            cost = estimate_tokens(text) + LINE_OVERHEAD
+            picked[i] = True
+            if cost > remaining:
+                skips += 1
+                continue
+            skips = 0
+            remaining -= cost
+            chosen.append(i)
+            comment = {"text": text, "count": int(counts[i]), "kind": kind}
+            if likes is not None:
+                comment["likes"] = float(like_sum[i])
+            sample.append(comment)
+    return sample
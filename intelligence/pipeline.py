@@ -1,12 +1,17 @@
-import re
 import time
 import pandas as pd
 import numpy as np
 from sklearn.decomposition import PCA
-from sklearn.feature_extraction.text import CountVectorizer
 
-from intelligence.clustering.clusterer import cluster_comments
-from intelligence.insights.insight_generator import generate_cluster_insight
+from config.settings import N_CLUSTERS
+from intelligence.clustering.clusterer import cluster_comments, cluster_geometry, select_representatives
+from intelligence.clustering.incremental import observe_comments
+from intelligence.insights.insight_generator import generate_insights
+from intelligence.insights.cache import get_insight_cache
+from intelligence.insights.sampling import select_prompt_sample
+from intelligence.text_features import text_features, cluster_keywords
+from intelligence.embeddings.quantize import QuantizedMatrix
+from intelligence.embeddings.ann import IVFIndex
 
 
 # Strategic priority weights
@@ -26,29 +31,47 @@ RISK_SCORES = {
     "Noise": 10
 }
 
-POS_WORDS = {
-    "love", "great", "amazing", "helpful", "clear", "awesome", "good", "nice",
-    "thanks", "thank", "appreciate", "useful"
-}
-NEG_WORDS = {
-    "confusing", "bad", "hate", "unclear", "hard", "boring", "terrible",
-    "wrong", "issue", "problem"
-}
+def _engagement_and_sentiment(comments_df, text_col="comment"):
+    has_likes = "likes" in comments_df.columns
+    has_sentiment = "sentiment" in comments_df.columns
+    if not (has_likes and has_sentiment):
+        # Word count stands in for likes when the export has none.
+        word_counts, lexicon_sentiment = text_features(comments_df[text_col])
+
+    if has_likes:
+        likes = comments_df["likes"].fillna(0).astype(float).to_numpy()
+    else:
+        likes = word_counts
+
+    if has_sentiment:
+        sentiment = comments_df["sentiment"].fillna(0).astype(float).to_numpy()
+    else:
+        sentiment = lexicon_sentiment
+    return likes, sentiment
 
 
-def _compute_sentiment(text):
-    tokens = re.findall(r"[a-zA-Z']+", str(text).lower())
-    if not tokens:
-        return 0.0
-    pos = sum(1 for t in tokens if t in POS_WORDS)
-    neg = sum(1 for t in tokens if t in NEG_WORDS)
-    if pos + neg == 0:
-        return 0.0
-    return (pos - neg) / (pos + neg)
+def _embedded_only(labeled_df, *columns):
+    # cluster_comments leaves out comments the provider rejected; keep per-row
+    # arrays computed on the input aligned with the rows it returned.
+    dropped = labeled_df.attrs.get("unembedded_rows")
+    if not dropped:
+        return columns
+    keep = np.ones(len(columns[0]), dtype=bool)
+    keep[dropped] = False
+    return tuple(c[keep] for c in columns)
 
 
-def _compute_engagement(text):
-    return float(len(str(text).split()))
+def _project_2d(embeddings, fit_sample=20000):
+    if len(embeddings) < 2:
+        return np.zeros((len(embeddings), 2))
+    if not isinstance(embeddings, QuantizedMatrix):
+        return PCA(n_components=2).fit_transform(np.asarray(embeddings, dtype=np.float32))
+
+    # Quantized matrices: fit on a dequantized sample, project block by block.
+    rng = np.random.default_rng(42)
+    sample = np.sort(rng.choice(len(embeddings), min(fit_sample, len(embeddings)), replace=False))
+    pca = PCA(n_components=2).fit(embeddings[sample].dequantize())
+    return np.vstack([pca.transform(block) for _, block in embeddings.chunks()])
 
 
 def _priority_from_impact(score):
@@ -59,33 +82,61 @@ def _priority_from_impact(score):
     return "Low"
 
 
-def run_intelligence_engine(comments_df, text_col="comment", n_clusters=8, batch_size=100, progress_callback=None):
-
-    import os
-    os.makedirs("data/processed", exist_ok=True)
-
-    temp_path = "data/processed/temp_comments.csv"
-    comments_df.to_csv(temp_path, index=False)
+def run_intelligence_engine(comments_df, text_col="comment", n_clusters=N_CLUSTERS, batch_size=None, progress_callback=None, incremental_key=None, likes=None, sentiment=None):
 
     # STEP 1 — clustering
     labeled_df, cluster_counts, total_comments, embeddings, embedding_time, clustering_time = cluster_comments(
-        temp_path,
+        comments_df,
         n_clusters=n_clusters,
         batch_size=batch_size,
-        progress_callback=progress_callback
+        progress_callback=progress_callback,
+        incremental_key=incremental_key,
+        text_col=text_col
     )
 
-    # STEP 2 — insight per cluster
+    if likes is None or sentiment is None:
+        likes, sentiment = _engagement_and_sentiment(comments_df, text_col)
+    likes, sentiment = _embedded_only(labeled_df, likes, sentiment)
+
+    # STEP 2 — insight per cluster, requested concurrently. Each prompt gets a
+    # token-budgeted sample plus exact aggregates, so its size doesn't grow
+    # with the cluster. Without a likes column, likes holds word counts, which
+    # must not reach the model as likes.
+    has_likes = "likes" in comments_df.columns
+    groups = list(labeled_df.groupby("cluster"))
+    samples, prompt_stats = [], []
+    for cluster_id, group in groups:
+        rows = group.index.to_numpy()
+        sample = select_prompt_sample(
+            group[text_col].astype(str),
+            embeddings[rows],
+            likes[rows] if has_likes else None
+        )
+        samples.append(sample)
+        stats = {
+            "comments": int(cluster_counts.get(cluster_id, len(group))),
+            "share_pct": round(cluster_counts.get(cluster_id, len(group)) / total_comments * 100, 2),
+            "distinct_comments": int(group[text_col].nunique())
+        }
+        if has_likes:
+            stats["avg_likes"] = round(float(likes[rows].mean()), 2)
+        stats["avg_sentiment"] = round(float(sentiment[rows].mean()), 3)
+        prompt_stats.append(stats)
+
+    insight_stats = {}
+    insights = generate_insights(
+        samples,
+        cache=get_insight_cache(),
+        stats_callback=insight_stats.update,
+        cluster_stats=prompt_stats,
+        cluster_ids=[cluster_id for cluster_id, _ in groups]
+    )
     cluster_summaries = []
 
-    for cluster_id, group in labeled_df.groupby("cluster"):
-
-        insight = generate_cluster_insight(
-            group[text_col].tolist()
-        )
+    for (cluster_id, group), insight in zip(groups, insights):
 
         # comment share %
-        share_pct = (len(group) / total_comments) * 100
+        share_pct = (cluster_counts.get(cluster_id, len(group)) / total_comments) * 100
 
         # classification weight
         classification = insight.get("classification", "Noise")
@@ -105,43 +156,47 @@ def run_intelligence_engine(comments_df, text_col="comment", n_clusters=8, batch
     # STEP 3 — rank by impact
     ranked_df = ranked_df.sort_values(
         "impact_score",
-        ascending=False
+        ascending=False,
+        kind="stable"
     ).reset_index(drop=True)
+    ranked_df.attrs["insight_cache"] = insight_stats
 
     return ranked_df, labeled_df, embeddings, embedding_time, clustering_time
 
 
-def run_analysis(comments_df, text_col="comment", n_clusters=8, batch_size=100, progress_callback=None):
+def run_analysis(comments_df, text_col="comment", n_clusters=N_CLUSTERS, batch_size=None, progress_callback=None, incremental_key=None):
+    # incremental_key: (creator_id, video_id). The comments are folded into that
+    # video's persisted clusters and metrics/shares cover all comments so far.
     start_time = time.time()
+    likes, sentiment = _engagement_and_sentiment(comments_df, text_col)
     ranked_df, labeled_df, embeddings, embedding_time, clustering_time = run_intelligence_engine(
         comments_df,
         text_col=text_col,
         n_clusters=n_clusters,
         batch_size=batch_size,
-        progress_callback=progress_callback
+        progress_callback=progress_callback,
+        incremental_key=incremental_key,
+        likes=likes,
+        sentiment=sentiment
     )
 
-    clusters_df = labeled_df.copy()
+    likes, sentiment = _embedded_only(labeled_df, likes, sentiment)
+    clusters_df = labeled_df.copy(deep=False)
     if text_col in clusters_df.columns and "comment" not in clusters_df.columns:
         clusters_df = clusters_df.rename(columns={text_col: "comment"})
 
     comment_series = clusters_df["comment"].astype(str)
 
-    embeddings_array = np.array(embeddings)
-    if len(embeddings_array) >= 2:
-        coords = PCA(n_components=2).fit_transform(embeddings_array)
-    else:
-        coords = np.zeros((len(embeddings_array), 2))
+    coords = _project_2d(embeddings)
 
-    if "likes" in comments_df.columns:
-        likes = comments_df["likes"].fillna(0).astype(float).to_numpy()
-    else:
-        likes = comment_series.apply(_compute_engagement).to_numpy()
+    # Similarity index over the full embeddings; rows line up with clusters_df.
+    ann_index = IVFIndex.build(embeddings)
 
-    if "sentiment" in comments_df.columns:
-        sentiment = comments_df["sentiment"].fillna(0).astype(float).to_numpy()
-    else:
-        sentiment = comment_series.apply(_compute_sentiment).to_numpy()
+    labels = clusters_df["cluster"].to_numpy()
+    cluster_ids, centroids, distances = cluster_geometry(embeddings, labels)
+    clusters_df["distance_to_centroid"] = distances
+
+    representatives = select_representatives(labels, distances, likes, groups=clusters_df["duplicate_group"].to_numpy())
 
     embeddings_2d = pd.DataFrame({
         "x": coords[:, 0],
@@ -152,16 +207,26 @@ def run_analysis(comments_df, text_col="comment", n_clusters=8, batch_size=100,
         "sentiment": sentiment
     })
 
-    cluster_metrics = (
-        embeddings_2d.groupby("cluster")
-        .agg(
-            cluster_size=("comment", "count"),
-            avg_likes=("likes", "mean"),
-            avg_sentiment=("sentiment", "mean"),
-            engagement_std=("likes", "std")
+    if incremental_key is not None:
+        new = clusters_df["is_new"].to_numpy()
+        state = observe_comments(
+            incremental_key,
+            clusters_df["cluster"].to_numpy()[new],
+            likes[new],
+            sentiment[new]
+        )
+        cluster_metrics = state.metrics()
+    else:
+        cluster_metrics = (
+            embeddings_2d.groupby("cluster")
+            .agg(
+                cluster_size=("comment", "count"),
+                avg_likes=("likes", "mean"),
+                avg_sentiment=("sentiment", "mean"),
+                engagement_std=("likes", "std")
+            )
+            .reset_index()
         )
-        .reset_index()
-    )
 
     impact_scores = ranked_df.copy()
     if "theme" not in impact_scores.columns:
@@ -171,9 +236,12 @@ def run_analysis(comments_df, text_col="comment", n_clusters=8, batch_size=100,
     ).fillna(10)
     impact_scores["priority"] = impact_scores["impact_score"].apply(_priority_from_impact)
 
-    comment_counts = (
-        clusters_df.groupby("cluster")["comment"].count().reset_index()
-    )
+    if incremental_key is not None:
+        comment_counts = cluster_metrics[["cluster", "cluster_size"]].copy()
+    else:
+        comment_counts = (
+            clusters_df.groupby("cluster")["comment"].count().reset_index()
+        )
     comment_counts.columns = ["cluster_id", "comment_count"]
 
     if "cluster_id" in impact_scores.columns:
@@ -204,21 +272,7 @@ def run_analysis(comments_df, text_col="comment", n_clusters=8, batch_size=100,
             "risk_flag": row.get("risk_flag", "None")
         })
 
-    keywords = {}
-    vectorizer = CountVectorizer(stop_words="english", max_features=8)
-    for cluster_id, group in clusters_df.groupby("cluster"):
-        comments = group["comment"].astype(str).tolist()
-        if not comments:
-            keywords[str(cluster_id)] = []
-            continue
-        matrix = vectorizer.fit_transform(comments)
-        freqs = np.asarray(matrix.sum(axis=0)).ravel()
-        terms = vectorizer.get_feature_names_out()
-        term_df = pd.DataFrame({
-            "keyword": terms,
-            "importance": freqs
-        }).sort_values("importance", ascending=False)
-        keywords[str(cluster_id)] = term_df.head(5).to_dict(orient="records")
+    keywords = cluster_keywords(clusters_df["comment"], labels)
 
     total_time = time.time() - start_time
 
@@ -229,21 +283,29 @@ def run_analysis(comments_df, text_col="comment", n_clusters=8, batch_size=100,
         "impact_scores": impact_scores,
         "embeddings_2d": embeddings_2d,
         "keywords": keywords,
+        "ann_index": ann_index,
+        "representatives": representatives,
+        "centroids": {c.item(): centroid.tolist() for c, centroid in zip(cluster_ids, centroids)},
         "performance": {
             "total_rows": len(clusters_df),
             "total_time": total_time,
             "rows_per_second": len(clusters_df) / total_time if total_time > 0 else 0,
             "embedding_time": embedding_time,
-            "clustering_time": clustering_time
+            "clustering_time": clustering_time,
+            "k_selection": labeled_df.attrs.get("k_selection"),
+            "unembedded_comments": len(labeled_df.attrs.get("unembedded_rows", [])),
+            "clusters_refit": labeled_df.attrs.get("clusters_refit", False),
+            "insight_cache": ranked_df.attrs.get("insight_cache")
         }
     }
 
 
-def run_intelligence(comments_df, text_col="comment", n_clusters=8, batch_size=100, progress_callback=None):
+def run_intelligence(comments_df, text_col="comment", n_clusters=N_CLUSTERS, batch_size=None, progress_callback=None, incremental_key=None):
     return run_analysis(
         comments_df,
         text_col=text_col,
         n_clusters=n_clusters,
         batch_size=batch_size,
-        progress_callback=progress_callback
+        progress_callback=progress_callback,
+        incremental_key=incremental_key
     )
@@ -0,0 +1,201 @@
+import re
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+
+from config.settings import SENTIMENT_NEGATION
+
+POS_WORDS = {
+    "love", "great", "amazing", "helpful", "clear", "awesome", "good", "nice",
+    "thanks", "thank", "appreciate", "useful"
+}
+NEG_WORDS = {
+    "confusing", "bad", "hate", "unclear", "hard", "boring", "terrible",
+    "wrong", "issue", "problem"
+}
+# A lexicon word straight after one of these counts with flipped polarity
+# when negation is on ("not good", "don't love").
+NEGATORS = {
+    "not", "no", "never", "dont", "don't", "cant", "can't", "cannot", "isnt", "isn't",
+    "wasnt", "wasn't", "doesnt", "doesn't", "didnt", "didn't", "wont", "won't", "arent", "aren't"
+}
+
+# Non-ASCII characters str.split() treats as whitespace.
+UNICODE_SPACE_RE = re.compile("[\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]")
+ASCII_LOWER = np.uint64(0x2020202020202020)
+KEY_MIX = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F))
+
+
+def _encode(texts):
+    # One NUL-separated byte buffer for the whole corpus. Everything below is
+    # array operations on it; only byte-level ASCII rules are applied, so the
+    # rare non-ASCII cases that would change the result are rewritten first.
+    joined = "\0".join(texts) + "\0"
+    if joined.count("\0") != len(texts):
+        joined = "\0".join(t.replace("\0", "\x01") for t in texts) + "\0"
+    if not joined.isascii():
+        if "\u212a" in joined or "\u0130" in joined:
+            # The only lowercase mappings that land in ASCII letters.
+            joined = joined.lower()
+        joined = UNICODE_SPACE_RE.sub(" ", joined)
+    buf = np.frombuffer(joined.encode("utf-8"), dtype=np.uint8)
+    return buf, np.flatnonzero(buf == 0)
+
+
+def _windows(buf):
+    # Unaligned little-endian uint64 starting at every byte.
+    padded = np.concatenate([buf, np.zeros(8, dtype=np.uint8)])
+    return np.ndarray(shape=(len(buf),), dtype="<u8", buffer=padded, strides=(1,))
+
+
+def _token_spans(buf):
+    # Runs of [a-zA-Z'], the tokenizer the lexicon was written against.
+    token = ((buf | np.uint8(32)) - np.uint8(97) < 26) | (buf == 39)
+    edges = np.flatnonzero(token[1:] != token[:-1]) + 1
+    if len(token) and token[0]:
+        edges = np.r_[0, edges]
+    return edges[::2], edges[1::2]
+
+
+def _token_keys(windows, starts, lengths):
+    # Case-folded first and last 8 bytes plus length, mixed into one uint64.
+    # Collisions only propose a match; _lexicon_hits verifies it.
+    short = lengths < 8
+    mask = np.full(len(starts), np.iinfo(np.uint64).max, dtype=np.uint64)
+    mask[short] = (np.uint64(1) << (lengths[short].astype(np.uint64) * np.uint64(8))) - np.uint64(1)
+    first = (windows[starts] | ASCII_LOWER) & mask
+    last = np.zeros(len(starts), dtype=np.uint64)
+    long_ = ~short
+    last[long_] = windows[starts[long_] + lengths[long_] - 8] | ASCII_LOWER
+    return first, last, first ^ (last * KEY_MIX[0]) ^ (lengths.astype(np.uint64) * KEY_MIX[1])
+
+
+def _lexicon_hits(buf, starts, ends, words):
+    # Token positions (into starts) that spell one of words, and which word.
+    words = sorted(words)
+    word_buf = np.frombuffer(("\0".join(words) + "\0").encode("ascii"), dtype=np.uint8)
+    word_lengths = np.array([len(w) for w in words], dtype=np.int64)
+    word_starts = np.r_[0, np.cumsum(word_lengths + 1)[:-1]]
+    word_first, word_last, word_keys = _token_keys(_windows(word_buf), word_starts, word_lengths)
+    order = np.argsort(word_keys)
+
+    # Only tokens whose lowercased first byte and length match some word are
+    # keyed, which leaves a small fraction of the corpus.
+    shape = np.zeros((256, word_lengths.max() + 1), dtype=bool)
+    shape[word_buf[word_starts], word_lengths] = True
+    lengths = ends - starts
+    fits = shape[buf[starts] | np.uint8(32), np.minimum(lengths, word_lengths.max())]
+    candidates = np.flatnonzero(fits & (lengths <= word_lengths.max()))
+    first, last, keys = _token_keys(_windows(buf), starts[candidates], lengths[candidates])
+    slot = np.minimum(np.searchsorted(word_keys[order], keys), len(words) - 1)
+    word = order[slot]
+    hit = (
+        (word_keys[word] == keys) & (word_first[word] == first) &
+        (word_last[word] == last) & (word_lengths[word] == lengths[candidates])
+    )
+    return candidates[hit], word[hit], words
+
+
+def lexicon_counts(texts, negation=False):
+    # Sparse (len(texts), 2 * lexicon) token counts over POS_WORDS | NEG_WORDS;
+    # the second half holds negated occurrences when negation is on.
+    buf, separators = _encode(texts)
+    return _lexicon_counts(buf, separators, len(texts), negation)
+
+
+def _lexicon_counts(buf, separators, n_texts, negation):
+    starts, ends = _token_spans(buf)
+    tokens, word, words = _lexicon_hits(buf, starts, ends, POS_WORDS | NEG_WORDS)
+    doc = np.searchsorted(separators, starts[tokens])
+    column = word.copy()
+
+    if negation and len(tokens):
+        negated, _, _ = _lexicon_hits(buf, starts, ends, NEGATORS)
+        previous = tokens - 1
+        flip = np.isin(previous, negated) & (previous >= 0)
+        flip[flip] &= np.searchsorted(separators, starts[previous[flip]]) == doc[flip]
+        column[flip] += len(words)
+
+    counts = sp.csr_matrix(
+        (np.ones(len(tokens), dtype=np.float64), (doc, column)),
+        shape=(n_texts, 2 * len(words))
+    )
+    return counts, words
+
+
+def _lexicon_weights(words):
+    # (2 * lexicon, 2) columns of positive / negative hits; negated
+    # occurrences swap sides.
+    polarity = np.array([[w in POS_WORDS, w in NEG_WORDS] for w in words], dtype=np.float64)
+    return np.vstack([polarity, polarity[:, ::-1]])
+
+
+def _word_counts(buf, separators):
+    # Same count as len(text.split()): starts of non-whitespace runs.
+    space = (buf == 32) | (buf - np.uint8(9) < 5) | (buf - np.uint8(28) < 4) | (buf == 0)
+    run_start = ~space
+    run_start[1:] &= space[:-1]
+    doc_starts = np.r_[0, separators[:-1] + 1]
+    return np.add.reduceat(run_start, doc_starts, dtype=np.int64).astype(float)
+
+
+def text_features(texts, negation=SENTIMENT_NEGATION):
+    # Word counts and lexicon sentiment for every text in one pass. Texts are
+    # factorized first, so each distinct comment is scored once. Sentiment is
+    # (pos - neg) / (pos + neg) over lexicon hits, 0 without any. The speedup
+    # over per-row scoring depends on repetition: ~130x on the tiled sample
+    # CSV, ~4x when all 1M rows are distinct (benchmarks/text_features.py).
+    codes, uniques = pd.factorize(pd.Series(texts), sort=False, use_na_sentinel=False)
+    if len(uniques) == 0:
+        return np.zeros(len(codes)), np.zeros(len(codes))
+
+    # to_numpy first: iterating an Arrow-backed Index boxes one value at a time.
+    buf, separators = _encode(list(map(str, uniques.to_numpy(dtype=object))))
+    counts, words = _lexicon_counts(buf, separators, len(uniques), negation)
+    polarity = np.asarray(counts @ _lexicon_weights(words))
+    pos, neg = polarity[:, 0], polarity[:, 1]
+    total = pos + neg
+    sentiment = np.divide(pos - neg, total, out=np.zeros(len(uniques)), where=total > 0)
+    return _word_counts(buf, separators)[codes], sentiment[codes]
+
+
+def cluster_keywords(texts, labels, top_n=10):
+    # Top class-based TF-IDF terms for every cluster from one vectorizer fit:
+    # distinct texts are counted once, then a (clusters x distinct texts)
+    # indicator matrix sums them into per-cluster term counts. A term scores
+    # tf_in_cluster * log(1 + avg_cluster_words / corpus_count), so words
+    # common everywhere rank below the ones that set a cluster apart.
+    codes, uniques = pd.factorize(pd.Series(texts), sort=False, use_na_sentinel=False)
+    cluster_ids, cluster_index = np.unique(np.asarray(labels), return_inverse=True)
+    keywords = {str(c): [] for c in cluster_ids}
+    vectorizer = CountVectorizer(stop_words="english")
+    try:
+        term_counts = vectorizer.fit_transform(map(str, uniques.to_numpy(dtype=object)))
+    except ValueError:
+        # Nothing but stop words.
+        return keywords
+
+    indicator = sp.csr_matrix(
+        (np.ones(len(codes)), (cluster_index, codes)),
+        shape=(len(cluster_ids), len(uniques))
+    )
+    counts = sp.csr_matrix(indicator @ term_counts, dtype=np.float64)
+    cluster_words = np.asarray(counts.sum(axis=1)).ravel()
+    corpus_counts = np.asarray(counts.sum(axis=0)).ravel()
+    idf = np.log1p(cluster_words.mean() / np.maximum(corpus_counts, 1))
+    scores = sp.diags(1 / np.maximum(cluster_words, 1)) @ counts @ sp.diags(idf)
+    scores = sp.csr_matrix(scores)
+
+    terms = vectorizer.get_feature_names_out()
+    for row, cluster_id in enumerate(cluster_ids):
+        lo, hi = scores.indptr[row], scores.indptr[row + 1]
+        columns, values = scores.indices[lo:hi], scores.data[lo:hi]
+        # Ties go to the alphabetically first term.
+        top = np.lexsort((columns, -values))[:top_n]
+        keywords[str(cluster_id)] = [
+            {"keyword": terms[columns[i]], "importance": float(values[i]), "count": int(counts[row, columns[i]])}
+            for i in top
+        ]
+    return keywords
@@ -7,16 +7,13 @@ import pickle
 import random
 import numpy as np
 import pandas as pd
-import redis
 
-from config.settings import STORAGE_PROCESSED_DIR, REDIS_URL
+from config.settings import STORAGE_PROCESSED_DIR, N_CLUSTERS
 from pipelines.preprocess import normalize_columns, detect_comment_column, detect_optional_columns
 from utils.hashing import dataset_hash
+from utils.redis_client import get_redis
 from intelligence.pipeline import run_analysis
-
-
-def get_redis():
-    return redis.Redis.from_url(REDIS_URL)
+from intelligence.embeddings.ann import dataset_index_path
 
 
 def update_job_status(job_id, status, progress=None):
@@ -29,7 +26,7 @@ def update_job_status(job_id, status, progress=None):
     r.set(f"job:{job_id}", json.dumps(payload))
 
 
-def process_comments(df, job_id=None, dataset_id=None):
+def process_comments(df, job_id=None, dataset_id=None, creator_id=None, video_id=None):
     np.random.seed(42)
     random.seed(42)
 
@@ -61,12 +58,17 @@ def process_comments(df, job_id=None, dataset_id=None):
     results = run_analysis(
         df,
         text_col="comment",
-        n_clusters=8,
-        batch_size=100
+        n_clusters=N_CLUSTERS,
+        incremental_key=(creator_id, video_id) if video_id else None
     )
     total_time = time.time() - start
     results["performance"]["total_time"] = total_time
 
+    # The index is served from its own memory-mapped artifact, not the
+    # pickled results.
+    ann_index = results.pop("ann_index")
+    ann_index.save(dataset_index_path(dataset_id))
+
     results = {
         **results,
         "dataset_id": dataset_id
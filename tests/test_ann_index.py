@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+
+from intelligence.embeddings.ann import IVFIndex, current_build
+
+
+def test_search_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, 32))
+    vectors = (centers[rng.integers(0, 20, 4000)] + rng.normal(0, 0.3, (4000, 32))).astype(np.float32)
+
+    index = IVFIndex.build(vectors, n_lists=40)
+    index.save(str(tmp_path))
+    index = IVFIndex.load(str(tmp_path))
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    hits = 0
+    for row in range(0, 4000, 100):
+        exact = set(np.argsort(-(unit @ unit[row]))[1:11])
+        rows, scores = index.similar(row, k=10)
+        assert row not in rows
+        assert np.all(np.diff(scores) <= 1e-6)
+        hits += len(exact & set(rows))
+    assert hits / 400 > 0.9
+
+
+
+def test_saves_swap_whole_builds(tmp_path):
+    rng = np.random.default_rng(1)
+    first = IVFIndex.build(rng.standard_normal((300, 8)).astype(np.float32), n_lists=4)
+    second = IVFIndex.build(rng.standard_normal((500, 8)).astype(np.float32), n_lists=6)
+    path = str(tmp_path)
+
+    first.save(path)
+    first_build = current_build(path)
+    second.save(path)
+    # A save that dies halfway never becomes the current build.
+    os.makedirs(os.path.join(path, "partial"))
+    np.save(os.path.join(path, "partial", "centroids.npy"), first.centroids)
+
+    loaded = IVFIndex.load(path)
+    assert len(loaded.rows) == 500 and len(loaded.centroids) == 6
+    assert os.path.isdir(first_build)
+
+    first.save(path)
+    assert not os.path.exists(first_build) and not os.path.exists(os.path.join(path, "partial"))
+    assert len(IVFIndex.load(path).rows) == 300
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from intelligence.clustering import clusterer
+
+
+def _fake_embed(texts, **kwargs):
+    # Two well-separated groups: comments about price vs everything else.
+    return np.array([[1.0, 0.0] if "price" in t else [0.0, 1.0] for t in texts], dtype=np.float32)
+
+
+def test_frames_are_clustered_in_memory(monkeypatch):
+    monkeypatch.setattr(clusterer, "embed", _fake_embed)
+    frames = [
+        pd.DataFrame(
+            {"text": [f"price too high {i}" if i % 2 else f"love it {i}" for i in range(40)], "likes": range(40)},
+            index=range(100 + 40 * j, 140 + 40 * j)
+        )
+        for j in range(4)
+    ]
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda df: clusterer.cluster_comments(df, n_clusters=2, text_col="text"), frames))
+
+    for frame, (labeled, counts, total, embeddings, _, _) in zip(frames, results):
+        assert "cluster" not in frame.columns
+        assert list(labeled.index) == list(range(40))
+        assert (labeled["text"].to_numpy() == frame["text"].to_numpy()).all()
+        assert total == 40 and sorted(counts.values()) == [20, 20]
+        price = labeled["text"].str.contains("price").to_numpy()
+        assert labeled["cluster"][price].nunique() == 1
+        assert len(embeddings) == 40
+
+    labeled = clusterer.cluster_comments(frames[0]["text"], n_clusters=2, text_col="text")[0]
+    assert list(labeled.columns) == ["text", "cluster", "duplicate_group"]
+
+
+def test_rejected_comments_are_left_out(monkeypatch):
+    def embed_rejecting_spam(texts, stats_callback=None, **kwargs):
+        vectors = _fake_embed(texts)
+        failed = [i for i, t in enumerate(texts) if t.startswith("spam")]
+        vectors[failed] = 0
+        stats_callback({"failed": failed})
+        return vectors
+
+    monkeypatch.setattr(clusterer, "embed", embed_rejecting_spam)
+    texts = ["spam link", "price too high", "love it", "spam link", "price is steep", "love this"]
+
+    labeled, counts, total, embeddings, _, _ = clusterer.cluster_comments(texts, n_clusters=2, text_col="text")
+
+    assert labeled.attrs["unembedded_rows"] == [0, 3]
+    assert labeled["text"].tolist() == ["price too high", "love it", "price is steep", "love this"]
+    assert total == 4 and len(embeddings) == 4
+    assert labeled["cluster"][0] == labeled["cluster"][2] != labeled["cluster"][1]
@@ -0,0 +1,42 @@
+import numpy as np
+
+from intelligence.clustering.clusterer import cluster_geometry, select_representatives
+from intelligence.embeddings.quantize import quantize
+
+
+def test_geometry_and_representatives():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((500, 16)).astype(np.float32)
+    labels = rng.integers(0, 4, 500)
+    likes = rng.integers(0, 100, 500)
+
+    cluster_ids, centroids, distances = cluster_geometry(embeddings, labels, chunk_rows=64)
+    assert cluster_ids.tolist() == [0, 1, 2, 3]
+    np.testing.assert_allclose(centroids[2], embeddings[labels == 2].mean(axis=0), atol=1e-5)
+    np.testing.assert_allclose(distances, np.linalg.norm(embeddings - centroids[labels], axis=1), rtol=1e-5)
+
+    # Quantized matrices stream through the same path.
+    _, _, q_distances = cluster_geometry(quantize(embeddings, "int8"), labels)
+    assert np.abs(q_distances - distances).max() < 0.05
+
+    reps = select_representatives(labels, distances, likes, k=3)
+    for c in cluster_ids:
+        members = np.flatnonzero(labels == c)
+        assert reps[c]["central"] == members[np.argsort(distances[members])[:3]].tolist()
+        assert reps[c]["divergent"] == members[np.argsort(-distances[members])[:3]].tolist()
+        assert sorted(likes[reps[c]["most_liked"]], reverse=True) == sorted(likes[members])[::-1][:3]
+
+
+def test_duplicate_groups_count_once():
+    # Rows 0-3 are one comment repeated (same group, same distance).
+    labels = np.zeros(8, dtype=np.int64)
+    distances = np.array([0.1, 0.1, 0.1, 0.1, 0.2, 0.3, 0.4, 0.5])
+    likes = np.array([1, 9, 2, 3, 4, 0, 5, 6])
+    groups = np.array([0, 0, 0, 0, 1, 2, 3, 4])
+
+    assert select_representatives(labels, distances, likes, k=3)[0]["central"] == [0, 1, 2]
+
+    reps = select_representatives(labels, distances, likes, k=3, groups=groups)[0]
+    assert reps["central"] == [0, 4, 5]
+    assert reps["most_liked"] == [1, 7, 6]
+    assert reps["divergent"] == [7, 6, 5]
@@ -0,0 +1,118 @@
+import time
+import threading
+
+import pytest
+
+from intelligence.embeddings.dispatcher import dispatch_batches, isolate_bad_inputs
+
+
+class StubError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class StubClient:
+    def __init__(self, latency=0.01, fail_every=0, status_code=429):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.status_code = status_code
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def embed(self, batch):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            if self.fail_every and call % self.fail_every == 0:
+                raise StubError(self.status_code)
+            return [[float(len(text))] for text in batch]
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_results_keep_input_order_under_concurrency():
+    stub = StubClient(latency=0.02)
+    batches = [["x" * (i + 1)] for i in range(20)]
+    progress = []
+
+    results = dispatch_batches(
+        batches,
+        stub.embed,
+        max_in_flight=4,
+        progress_callback=lambda done, total, eta: progress.append((done, total, eta))
+    )
+
+    assert results == [[[float(i + 1)]] for i in range(20)]
+    assert 1 < stub.peak_in_flight <= 4
+    assert [p[0] for p in progress] == list(range(1, 21))
+    assert progress[-1][2] == 0
+
+
+def test_retries_throttled_batches():
+    stub = StubClient(fail_every=3)
+    batches = [["a"], ["bb"], ["ccc"], ["dddd"], ["eeeee"]]
+
+    results = dispatch_batches(batches, stub.embed, max_in_flight=2, backoff=0.001)
+
+    assert [r[0][0] for r in results] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert stub.calls > len(batches)
+
+
+def test_non_retryable_error_propagates():
+    stub = StubClient(fail_every=1, status_code=400)
+
+    with pytest.raises(StubError):
+        dispatch_batches([["a"]], stub.embed, backoff=0.001)
+
+
+def test_bad_inputs_are_isolated_not_fatal():
+    def embed(batch):
+        if any(text == "bad" for text in batch):
+            raise StubError(400)
+        return [[float(len(text))] for text in batch]
+
+    guarded = isolate_bad_inputs(embed)
+    results = dispatch_batches([["a", "bad", "ccc", "dd"]], guarded, backoff=0.001)
+
+    assert results == [[[1.0], None, [3.0], [2.0]]]
+
+
+def test_rejected_request_raises_instead_of_splitting():
+    calls = []
+
+    def embed(batch):
+        calls.append(len(batch))
+        raise StubError(400)
+
+    guarded = isolate_bad_inputs(embed)
+    with pytest.raises(StubError):
+        dispatch_batches([["t"] * 1000, ["t"] * 1000], guarded, max_in_flight=1, backoff=0.001)
+
+    # The failing batch and the one-text probe, nothing more.
+    assert calls == [1000, 1]
+
+
+def test_splitting_stops_at_the_call_budget():
+    calls = []
+
+    def embed(batch):
+        calls.append(len(batch))
+        if any(text.startswith("bad") for text in batch):
+            raise StubError(422)
+        return [[1.0] for _ in batch]
+
+    texts = [f"bad {i}" if i % 10 == 0 else "ok" for i in range(1000)]
+    guarded = isolate_bad_inputs(embed, max_split_calls=20)
+    results = dispatch_batches([texts], guarded, backoff=0.001)[0]
+
+    assert len(calls) <= 1 + 20
+    assert len(results) == 1000
+    assert all(results[i] is None for i in range(0, 1000, 10))
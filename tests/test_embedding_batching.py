@@ -0,0 +1,23 @@
+from intelligence.embeddings.batching import estimate_tokens, plan_batches
+
+
+def test_cuts_before_the_token_budget():
+    texts = ["x" * 8] * 7
+    assert estimate_tokens(texts[0]) == 3
+
+    # Three 3-token texts fit in 10; the fourth would overflow.
+    assert plan_batches(texts, max_tokens=10, max_items=100) == [(0, 3), (3, 6), (6, 7)]
+
+
+def test_caps_items_per_batch():
+    texts = ["a"] * 5
+
+    assert plan_batches(texts, max_tokens=10_000, max_items=2) == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_oversized_text_gets_its_own_batch():
+    texts = ["short", "y" * 300, "short", "short"]
+
+    assert plan_batches(texts, max_tokens=20, max_items=100) == [(0, 1), (1, 2), (2, 4)]
+    assert plan_batches(["y" * 300], max_tokens=20, max_items=100) == [(0, 1)]
+    assert plan_batches([], max_tokens=20, max_items=100) == []
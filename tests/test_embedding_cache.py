@@ -0,0 +1,146 @@
+import numpy as np
+
+from intelligence.embeddings.cache import LRUEmbeddingCache, TieredEmbeddingCache, RedisEmbeddingCache
+from intelligence.embeddings.router import build_cache
+
+
+class StubRedis:
+    # Records every MGET and every pipeline flush; values live in a dict.
+    def __init__(self):
+        self.data = {}
+        self.mgets = []
+        self.flushes = []
+
+    def mget(self, keys):
+        self.mgets.append(list(keys))
+        return [self.data.get(k) for k in keys]
+
+    def pipeline(self, transaction=True):
+        return StubPipeline(self)
+
+
+class StubPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.queued = []
+
+    def set(self, key, value, ex=None):
+        self.queued.append((key, value, ex))
+
+    def execute(self):
+        self.client.flushes.append(self.queued)
+        for key, value, _ in self.queued:
+            self.client.data[key] = value
+        self.queued = []
+
+
+def _vectors(n, dim=4):
+    return np.arange(n * dim, dtype=np.float32).reshape(n, dim)
+
+
+def test_reads_are_chunked_by_key_count():
+    client = StubRedis()
+    cache = RedisEmbeddingCache(client, chunk_size=3, chunk_bytes=1 << 20)
+    hashes = [f"h{i}" for i in range(7)]
+    cache.set_many(hashes[:5], _vectors(5))
+    client.mgets.clear()
+    cache.stats["round_trips"] = 0
+
+    vectors, found = cache.get_many(hashes)
+
+    assert [len(keys) for keys in client.mgets] == [3, 3, 1]
+    assert client.mgets[0] == ["embed:h0", "embed:h1", "embed:h2"]
+    assert list(found) == [True] * 5 + [False] * 2
+    np.testing.assert_array_equal(vectors[:5], _vectors(5))
+    assert cache.stats["round_trips"] == 3
+    assert cache.stats["hits"] == 5 and cache.stats["misses"] == 2
+
+
+def test_writes_flush_on_chunk_bytes_and_pass_ttl():
+    client = StubRedis()
+    # Each float32 row of 4 is 16 bytes, so two rows fill a 32-byte chunk
+    # long before the key-count cap.
+    cache = RedisEmbeddingCache(client, chunk_size=100, chunk_bytes=32, ttl=600)
+
+    cache.set_many([f"h{i}" for i in range(5)], _vectors(5))
+
+    assert [len(flush) for flush in client.flushes] == [2, 2, 1]
+    assert {ex for flush in client.flushes for _, _, ex in flush} == {600}
+    assert cache.stats["round_trips"] == 3 and cache.stats["writes"] == 5
+
+
+def test_writes_flush_on_key_count_and_skip_ttl_when_disabled():
+    client = StubRedis()
+    cache = RedisEmbeddingCache(client, chunk_size=2, chunk_bytes=1 << 20, ttl=0)
+
+    cache.set_many([f"h{i}" for i in range(3)], _vectors(3))
+
+    assert [len(flush) for flush in client.flushes] == [2, 1]
+    assert all(ex is None for flush in client.flushes for _, _, ex in flush)
+
+
+def test_quantized_entries_use_their_own_prefix():
+    client = StubRedis()
+    cache = RedisEmbeddingCache(client, dtype="float16")
+    cache.set_many(["h0"], _vectors(1))
+
+    assert list(client.data) == ["embed:float16:h0"]
+    vectors, found = cache.get_many(["h0"])
+    assert found.all()
+    np.testing.assert_array_equal(vectors, _vectors(1))
+
+
+def test_lru_evicts_least_recent_by_bytes():
+    # Four float32 dims are 16 bytes a row; 48 bytes holds three.
+    cache = LRUEmbeddingCache(max_bytes=48)
+    cache.set_many(["a", "b", "c"], _vectors(3))
+    cache.get_many(["a"])
+    cache.set_many(["d"], _vectors(1))
+
+    _, found = cache.get_many(["a", "b", "c", "d"])
+    assert list(found) == [True, False, True, True]
+    assert cache.nbytes == 48 and len(cache) == 3
+    assert cache.stats["evictions"] == 1
+
+
+def test_lru_rewrite_does_not_double_count_bytes():
+    cache = LRUEmbeddingCache(max_bytes=48)
+    cache.set_many(["a", "a", "b"], _vectors(3))
+
+    assert cache.nbytes == 32 and cache.stats["evictions"] == 0
+
+    cache.set_many(["wide"], np.ones((1, 16), dtype=np.float32))
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_lru_disabled_stores_nothing():
+    cache = LRUEmbeddingCache(max_bytes=0)
+    cache.set_many(["a"], _vectors(1))
+
+    assert len(cache) == 0
+
+
+def test_tiered_promotes_slower_hits():
+    memory = LRUEmbeddingCache()
+    redis = RedisEmbeddingCache(StubRedis())
+    redis.set_many(["a", "b"], _vectors(2))
+    tiered = TieredEmbeddingCache([memory, redis])
+
+    vectors, found = tiered.get_many(["a", "x", "b"])
+    assert list(found) == [True, False, True]
+    np.testing.assert_array_equal(vectors[[0, 2]], _vectors(2))
+    assert len(memory) == 2
+
+    _, found = tiered.get_many(["b", "a"])
+    assert found.all()
+    assert tiered.stats["memory"]["hits"] == 2
+    # The second lookup never reached redis.
+    assert tiered.stats["redis"]["hits"] == 2 and tiered.stats["redis"]["misses"] == 1
+
+
+def test_redis_tiers_share_one_client():
+    first = build_cache(["redis"], namespace="local:a").tiers[0]
+    second = build_cache(["redis"], namespace="openai:b").tiers[0]
+
+    assert first.client is second.client
+    assert first.prefix != second.prefix
@@ -0,0 +1,90 @@
+import base64
+from types import SimpleNamespace
+
+import numpy as np
+
+from intelligence.embeddings.providers import OpenAIEmbeddingProvider
+from intelligence.embeddings.cache import LRUEmbeddingCache, TieredEmbeddingCache
+from intelligence.embeddings.router import embed
+from intelligence.embeddings.store import EmbeddingStore
+
+
+class StubProvider:
+    def __init__(self):
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return np.array([[len(t), t.count("?")] for t in texts], dtype=np.float32)
+
+    def retryable(self, exc):
+        return False
+
+
+def test_repeat_runs_hit_the_cache(tmp_path):
+    provider = StubProvider()
+    store = EmbeddingStore(str(tmp_path))
+    texts = ["part 2??", "source?", "part 2??", "lol"]
+
+    first = embed(texts, provider=provider, cache=TieredEmbeddingCache([LRUEmbeddingCache(), store]))
+    assert sorted(provider.embedded) == ["lol", "part 2??", "source?"]
+    np.testing.assert_array_equal(first[0], first[2])
+
+    stats = []
+    # Fresh memory tier: everything has to come back from disk.
+    second = embed(
+        texts,
+        provider=provider,
+        cache=TieredEmbeddingCache([LRUEmbeddingCache(), store]),
+        stats_callback=stats.append
+    )
+    assert len(provider.embedded) == 3
+    np.testing.assert_array_equal(first, second)
+    assert stats[0]["embedded"] == 0
+    assert stats[0]["disk"]["hits"] == 3
+
+
+class StubEmbeddingsAPI:
+    def create(self, model, input, encoding_format=None, **options):
+        assert encoding_format == "base64"
+        data = [
+            SimpleNamespace(embedding=base64.b64encode(np.array([len(t), 0.5], dtype="<f4").tobytes()).decode())
+            for t in input
+        ]
+        return SimpleNamespace(data=data)
+
+
+def test_openai_payloads_decode_into_float32_matrix():
+    provider = OpenAIEmbeddingProvider(client=SimpleNamespace(embeddings=StubEmbeddingsAPI()))
+    vectors = provider.embed(["abc", "de"])
+    assert vectors.dtype == np.float32 and vectors.flags.c_contiguous
+    np.testing.assert_array_equal(vectors, [[3, 0.5], [2, 0.5]])
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+class RejectingProvider(StubProvider):
+    # Rejects any batch containing a "BAD" text, the way the API answers 400.
+    def embed(self, texts):
+        if any("BAD" in t for t in texts):
+            raise BadRequest()
+        return super().embed(texts)
+
+
+def test_rejected_inputs_are_reported_not_stored():
+    stats = []
+    vectors = embed(
+        ["ok a", "BAD1", "ok b??", "BAD1", "BAD2"],
+        batch_size=2,
+        provider=RejectingProvider(),
+        cache=TieredEmbeddingCache([LRUEmbeddingCache()]),
+        stats_callback=stats.append
+    )
+    np.testing.assert_array_equal(vectors, [[4, 0], [0, 0], [6, 2], [0, 0], [0, 0]])
+    assert stats[0]["failed"] == [1, 3, 4]
+
+    stats = []
+    vectors = embed(["BAD1", "BAD2"], provider=RejectingProvider(), cache=TieredEmbeddingCache([]), stats_callback=stats.append)
+    assert vectors.shape[0] == 2 and stats[0]["failed"] == [0, 1]
@@ -0,0 +1,99 @@
+import threading
+import multiprocessing
+
+import numpy as np
+
+from intelligence.embeddings.store import EmbeddingStore
+from utils.hashing import text_hash
+
+
+def _append(path, offset):
+    store = EmbeddingStore(path)
+    texts = [f"comment {offset + i}" for i in range(50)]
+    vectors = np.full((len(texts), 4), offset, dtype=np.float32)
+    store.put_many([text_hash(t) for t in texts], vectors)
+
+
+def test_roundtrip_and_append_only(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    hashes = [text_hash(t) for t in ["part 2??", "source?", "🔥🔥"]]
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    assert store.put_many(hashes, vectors) == 3
+    assert store.put_many(hashes[:1], vectors[:1] + 1) == 0
+
+    reader = EmbeddingStore(str(tmp_path))
+    got, found = reader.get_many([hashes[2], text_hash("missing"), hashes[0]])
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_array_equal(got[0], vectors[2])
+    np.testing.assert_array_equal(got[2], vectors[0])
+    assert len(reader) == 3
+
+
+def test_concurrent_writers(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_append, args=(str(tmp_path), k * 1000)) for k in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    store = EmbeddingStore(str(tmp_path))
+    assert len(store) == 200
+    got, found = store.get_many([text_hash("comment 3007")])
+    assert found.all()
+    assert got[0].tolist() == [3000.0] * 4
+
+
+def test_compaction_keeps_recently_used_rows(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    hashes = [text_hash(f"comment {i}") for i in range(10)]
+    store.put_many(hashes, np.arange(40, dtype=np.float32).reshape(10, 4))
+    store.get_many(hashes[7:])
+
+    # Room for three rows: the three that were just read.
+    assert store.compact(max_bytes=3 * store.row_bytes, policy="lfu") == 7
+
+    reader = EmbeddingStore(str(tmp_path))
+    got, found = reader.get_many(hashes)
+    assert found.tolist() == [False] * 7 + [True] * 3
+    np.testing.assert_array_equal(got[9], [36, 37, 38, 39])
+
+
+def _churn(path, rounds):
+    # Append and compact over and over, shrinking the files each time.
+    store = EmbeddingStore(path)
+    for r in range(rounds):
+        texts = [f"churn {r} {i}" for i in range(200)]
+        store.put_many([text_hash(t) for t in texts], np.full((200, 4), -1, dtype=np.float32))
+        store.compact(max_bytes=100 * store.row_bytes)
+
+
+def test_readers_survive_concurrent_compaction(tmp_path):
+    path = str(tmp_path)
+    hashes = [text_hash(f"comment {i}") for i in range(300)]
+    vectors = np.repeat(np.arange(300, dtype=np.float32)[:, None], 4, axis=1)
+    EmbeddingStore(path).put_many(hashes, vectors)
+
+    ctx = multiprocessing.get_context("fork")
+    churn = ctx.Process(target=_churn, args=(path, 40))
+    churn.start()
+
+    shared = EmbeddingStore(path)
+    errors = []
+
+    def read():
+        try:
+            while churn.is_alive():
+                got, found = shared.get_many(hashes)
+                np.testing.assert_array_equal(got[found], vectors[found])
+        except Exception as exc:
+            errors.append(exc)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for t in readers:
+        t.start()
+    churn.join()
+    for t in readers:
+        t.join()
+    assert churn.exitcode == 0 and errors == []
@@ -0,0 +1,59 @@
+import numpy as np
+
+from intelligence.clustering.incremental import fold_comments, observe_comments, load_state, needs_fit
+
+
+def _blobs(rng, n):
+    centers = np.array([[5, 0], [0, 5], [-5, -5]], dtype=np.float32)
+    labels = rng.integers(0, 3, n)
+    return centers[labels] + rng.normal(0, 0.3, (n, 2)).astype(np.float32)
+
+
+def test_batches_fold_into_persisted_clusters(tmp_path):
+    root = str(tmp_path)
+    rng = np.random.default_rng(0)
+    key = ("creator", "video 1")
+
+    first = _blobs(rng, 300)
+    labels, new, _ = fold_comments(key, first, np.arange(300), ids=range(300), n_clusters=3, root=root)
+    assert new.all()
+    observe_comments(key, labels, np.ones(300), np.zeros(300), n_clusters=3, root=root)
+
+    # 50 new comments plus 10 already seen ones.
+    second = np.vstack([_blobs(rng, 50), first[:10]])
+    ids = list(range(1000, 1050)) + list(range(10))
+    labels, new, state = fold_comments(key, second, np.arange(60), ids=ids, n_clusters=3, root=root)
+    assert new.sum() == 50
+    np.testing.assert_array_equal(labels[50:], state.kmeans.predict(first[:10]))
+    observe_comments(key, labels[new], np.full(50, 3.0), np.zeros(50), n_clusters=3, root=root)
+
+    metrics = load_state(key, root=root).metrics()
+    assert state.total == 350
+    assert metrics["cluster_size"].sum() == 350
+    assert np.isclose((metrics["avg_likes"] * metrics["cluster_size"]).sum(), 300 + 150)
+
+
+def test_new_embedding_space_takes_the_new_k(tmp_path):
+    root = str(tmp_path)
+    rng = np.random.default_rng(1)
+    key = ("creator", "video 2")
+    fold_comments(key, _blobs(rng, 200), np.arange(200), n_clusters=3, root=root)
+
+    wider = np.hstack([_blobs(rng, 200), _blobs(rng, 200)])
+    _, _, state = fold_comments(key, wider, np.arange(200), n_clusters=5, root=root)
+    assert state.dim == 4 and state.n_clusters == 5 and state.kmeans.n_clusters == 5
+    assert load_state(key, root=root).n_clusters == 5
+
+
+def test_same_dim_from_another_space_resets(tmp_path):
+    root = str(tmp_path)
+    rng = np.random.default_rng(2)
+    key = ("creator", "video 3")
+    fold_comments(key, _blobs(rng, 200), np.arange(200), ids=range(200), n_clusters=3, namespace="local:a", root=root)
+    assert not needs_fit(key, 2, "local:a", root=root)
+    assert needs_fit(key, 2, "local:b", root=root)
+
+    _, new, state = fold_comments(key, _blobs(rng, 50), np.arange(50), ids=range(50), n_clusters=3, namespace="local:b", root=root)
+    # Every comment is folded into fresh centroids, including ids seen before.
+    assert new.all() and state.total == 50 and state.namespace == "local:b"
+    assert load_state(key, root=root).namespace == "local:b"
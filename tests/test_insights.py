@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import threading
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import numpy as np
+
+from intelligence.embeddings.batching import estimate_tokens
+from intelligence.insights.cache import DiskInsightCache
+from intelligence.insights.insight_generator import generate_insights, build_insight_prompt, parse_batch, parse_insight
+from intelligence.insights.sampling import select_prompt_sample, LINE_OVERHEAD
+
+
+class StubModel:
+    def __init__(self, latency=0.05, fail=()):
+        self.latency = latency
+        self.fail = set(fail)
+        self.in_flight = 0
+        self.peak = 0
+        self.attempts = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, texts, stats=None):
+        key = texts[0]
+        with self._lock:
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            if key in self.fail:
+                raise ValueError("not json")
+            return {"theme": key, "classification": "Praise"}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_insights_run_concurrently_in_order():
+    model = StubModel()
+    clusters = [[f"cluster {i}"] for i in range(12)]
+    start = time.time()
+    insights = generate_insights(clusters, generate=model, max_in_flight=4, batch_clusters=1)
+    assert time.time() - start < 12 * model.latency / 2
+    assert model.peak == 4
+    assert [i["theme"] for i in insights] == [c[0] for c in clusters]
+
+
+def test_progress_reports_eta():
+    model = StubModel(latency=0.01)
+    progress = []
+    generate_insights(
+        [[f"cluster {i}"] for i in range(4)], generate=model, max_in_flight=1,
+        batch_clusters=1, progress_callback=lambda *args: progress.append(args)
+    )
+    assert [p[:2] for p in progress] == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert progress[0][2] > 0 and progress[-1][2] == 0
+
+
+def test_failed_cluster_does_not_sink_the_job():
+    model = StubModel(latency=0, fail={"cluster 1"})
+    insights = generate_insights([["cluster 0"], ["cluster 1"]], generate=model, max_retries=2, backoff=0, batch_clusters=1)
+    assert insights[0]["theme"] == "cluster 0"
+    assert insights[1]["classification"] == "Noise" and "error" in insights[1]
+    assert model.attempts["cluster 1"] == 3
+
+
+def test_unchanged_clusters_are_served_from_cache(tmp_path):
+    cache = DiskInsightCache(str(tmp_path))
+    clusters = [["love it", "so good"], ["price?", "too expensive"]]
+    model = StubModel(latency=0)
+    first = generate_insights(clusters, generate=model, cache=cache, batch_clusters=1)
+
+    stats = []
+    # Same comments in another order still hit.
+    reordered = [["so good", "love it"], ["too expensive", "price?"]]
+    second = generate_insights(reordered, generate=model, cache=cache, stats_callback=stats.append, batch_clusters=1)
+    assert second == first
+    assert sum(model.attempts.values()) == 2
+    assert stats[0]["hits"] == 2 and stats[0]["requested"] == 0
+
+
+def test_failed_insights_are_not_cached(tmp_path):
+    cache = DiskInsightCache(str(tmp_path))
+    model = StubModel(latency=0, fail={"bad"})
+    generate_insights([["bad"]], generate=model, cache=cache, max_retries=0)
+    generate_insights([["bad"]], generate=model, cache=cache, max_retries=0)
+    assert model.attempts["bad"] == 2
+    assert cache.stats["writes"] == 0
+
+
+def test_prompt_sample_stays_within_budget():
+    rng = np.random.default_rng(0)
+    n = 5000
+    embeddings = rng.standard_normal((n, 16)).astype(np.float32)
+    embeddings[:4000] = embeddings[0] + 0.01 * embeddings[:4000]
+    texts = [f"same old comment {i % 50}" for i in range(4000)] + [f"odd one {i} " * 3 for i in range(1000)]
+    likes = np.zeros(n)
+    likes[4500] = 1000
+
+    sample = select_prompt_sample(texts, embeddings, likes, token_budget=300)
+    cost = sum(estimate_tokens(s["text"]) + LINE_OVERHEAD for s in sample)
+    assert cost <= 300
+    assert {s["kind"] for s in sample} == {"central", "liked", "divergent"}
+    assert [s for s in sample if s["kind"] == "liked"][0]["likes"] == 1000
+    assert any(s["text"].startswith("odd one") for s in sample if s["kind"] == "divergent")
+    assert len({s["text"] for s in sample}) == len(sample)
+
+    prompt = build_insight_prompt(sample, {"comments": n, "share_pct": 12.5, "avg_likes": 0.2})
+    assert "comments: 5000 (12.5% of all comments)" in prompt
+
+    # No likes column: nothing may be presented to the model as likes.
+    unliked = select_prompt_sample(texts, embeddings, token_budget=300)
+    prompt = build_insight_prompt(unliked, {"comments": n, "avg_sentiment": 0.1})
+    assert all("likes" not in s for s in unliked)
+    assert "like" not in prompt and "most repeated" in prompt and "[x" in prompt
+
+
+def _insight(theme, classification="Praise"):
+    return {"theme": theme, "classification": classification, "insight": "i", "suggested_action": "a", "risk_flag": "None"}
+
+
+def test_batch_parser_keeps_only_valid_entries():
+    content = "Sure! ```json\n" + json.dumps([
+        {"cluster_id": 3, **_insight("good")},
+        {"cluster_id": "7", **_insight("lowercase", "request")},
+        {"cluster_id": 8, **_insight("bad label", "Hype")},
+        {"cluster_id": 9, "theme": "missing fields"},
+        {"cluster_id": 99, **_insight("unknown id")}
+    ]) + "\n```"
+    parsed = parse_batch(content, [3, 7, 8, 9])
+    assert sorted(parsed) == [3, 7]
+    assert parsed[7]["classification"] == "Request"
+    assert parse_insight('{"theme": "t", "classification": "Noise", "insight": "i", "suggested_action": "a"}')["risk_flag"] == "None"
+
+
+def test_batched_requests_fall_back_per_cluster():
+    model = StubModel(latency=0)
+    batches = []
+
+    def generate_batch(clusters):
+        batches.append([c[0] for c in clusters])
+        # The model drops the last cluster of every batch.
+        return {cluster_id: _insight(texts[0]) for cluster_id, texts, _ in clusters[:-1]}
+
+    clusters = [[f"cluster {i}"] for i in range(6)]
+    stats = []
+    insights = generate_insights(
+        clusters, generate=model, generate_batch=generate_batch, batch_clusters=3,
+        cluster_ids=[10 + i for i in range(6)], stats_callback=stats.append
+    )
+    assert batches == [[10, 11, 12], [13, 14, 15]]
+    assert [i["theme"] for i in insights] == [c[0] for c in clusters]
+    assert sorted(model.attempts) == ["cluster 2", "cluster 5"]
+    assert stats[0]["requests"] == 4
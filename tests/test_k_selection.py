@@ -0,0 +1,34 @@
+import time
+import threading
+
+import numpy as np
+from sklearn.datasets import make_blobs
+
+from intelligence.clustering.clusterer import select_k
+
+
+def test_select_k_finds_blob_count():
+    X, _ = make_blobs(3000, n_features=16, centers=5, cluster_std=1.0, random_state=0)
+    k, diagnostics = select_k(X.astype(np.float32), k_min=2, k_max=9, time_budget=60)
+    assert k == 5
+    assert [c["k"] for c in diagnostics["candidates"]] == list(range(2, 10))
+    assert diagnostics["skipped"] == []
+
+
+def test_silhouette_peak_on_the_sweep_edge_defers_to_the_elbow():
+    # Far more blobs than the sweep reaches: silhouette still climbing at k_max.
+    X, _ = make_blobs(3000, n_features=16, centers=30, cluster_std=0.5, random_state=0)
+    k, diagnostics = select_k(X.astype(np.float32), k_min=2, k_max=10, time_budget=60)
+    assert diagnostics["silhouette_k"] == 10
+    assert k == diagnostics["elbow_k"] < 10
+
+
+def test_select_k_respects_time_budget():
+    X, _ = make_blobs(3000, n_features=16, centers=5, random_state=0)
+    threads = threading.active_count()
+    start = time.time()
+    k, diagnostics = select_k(X.astype(np.float32), k_min=2, k_max=9, time_budget=0, fallback_k=6)
+    # Nothing finished: the configured fallback, and no fit left running.
+    assert k == 6 and diagnostics["candidates"] == []
+    assert diagnostics["skipped"] == list(range(2, 10))
+    assert time.time() - start < 5 and threading.active_count() == threads
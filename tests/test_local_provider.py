@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from intelligence.embeddings.cache import TieredEmbeddingCache
+from intelligence.embeddings.providers import LocalEmbeddingProvider
+from intelligence.embeddings.router import embed, cache_namespace
+
+CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "synthetic_tiktok_comments_large.csv")
+
+
+def _provider(path):
+    return LocalEmbeddingProvider(dim=16, n_features=2 ** 12, path=str(path), min_fit_docs=200, refit_growth=4)
+
+
+def _comments(n=None):
+    return pd.read_csv(CSV)["comment_text"].astype(str).tolist()[:n]
+
+
+def test_fit_is_deterministic_across_reloads(tmp_path):
+    path = tmp_path / "local.pkl"
+    comments = _comments(600)
+    first = _provider(path).fit(comments)
+    vectors = first.embed(comments[:50])
+
+    reloaded = _provider(path)
+    assert reloaded.fit_version == first.fit_version
+    assert np.array_equal(reloaded.embed(comments[:50]), vectors)
+
+
+def test_small_first_batch_does_not_freeze_the_projection(tmp_path):
+    path = tmp_path / "local.pkl"
+    small = embed(["hello world"], provider=_provider(path), cache=TieredEmbeddingCache([]))
+    assert small.shape == (1, 16) and np.linalg.norm(small) > 0
+    assert _provider(path).components is None
+
+    comments = _comments()
+    vectors = embed(comments, provider=_provider(path), cache=TieredEmbeddingCache([]))
+    assert np.linalg.matrix_rank(vectors[:2000]) == 16
+    assert _provider(path).fitted
+
+
+def test_refit_moves_the_cache_namespace(tmp_path):
+    path = tmp_path / "local.pkl"
+    comments = _comments()
+    provider = _provider(path)
+    assert cache_namespace(provider).endswith(LocalEmbeddingProvider.bootstrap_version)
+
+    provider.fit(comments[:300])
+    fitted_namespace = cache_namespace(provider)
+    assert fitted_namespace != cache_namespace(_provider(tmp_path / "other.pkl"))
+
+    # Later jobs keep accumulating document frequencies without refitting...
+    provider.fit(comments[300:600])
+    assert provider.n_docs == 600 and cache_namespace(provider) == fitted_namespace
+
+    # ...until the corpus has grown refit_growth-fold since the last fit.
+    provider.fit(comments[600:1200])
+    assert provider.fitted_docs == 1200 and cache_namespace(provider) != fitted_namespace
+
+
+def test_repeat_fit_changes_nothing(tmp_path):
+    path = tmp_path / "local.pkl"
+    comments = _comments(1200)
+    provider = _provider(path).fit(comments)
+    version, n_docs, stat = provider.fit_version, provider.n_docs, os.stat(path)
+
+    provider.fit(comments[::-1])
+    _provider(path).fit(comments[:600])
+
+    assert provider.fit_version == version and provider.n_docs == n_docs == 1200
+    assert os.stat(path).st_mtime_ns == stat.st_mtime_ns and os.stat(path).st_ino == stat.st_ino
+
+
+def test_workers_merge_counts(tmp_path):
+    comments = _comments(400)
+    shared = tmp_path / "local.pkl"
+    first, second = _provider(shared), _provider(shared)
+    first.fit(comments[:250])
+    second.fit(comments[150:])
+    first.fit(comments[:10])
+
+    single = _provider(tmp_path / "single.pkl").fit(comments)
+    merged = _provider(shared)
+    assert merged.n_docs == first.n_docs == single.n_docs
+    assert np.array_equal(merged.doc_freq, single.doc_freq)
@@ -0,0 +1,44 @@
+from intelligence.embeddings.dedup import deduplicate, normalize_text, normalize_texts
+from intelligence.embeddings.minhash import near_duplicate_groups, _shingles
+
+
+def test_spam_wave_collapses_to_one_group():
+    spam = [f"Follow me for a FREE iphone giveaway, link in bio!! code {i}" for i in range(200)]
+    texts = ["please explain the method step by step", "this was so helpful thanks"] + spam
+    groups = near_duplicate_groups(texts, threshold=0.7)
+    assert groups[0] == 0 and groups[1] == 1
+    assert len(set(groups[2:])) == 1
+    assert groups[2] not in (0, 1)
+
+
+def test_deduplicate_keeps_counts_for_shares():
+    texts = ["great video"] + ["buy followers now at cheapfollows dot com 1"] * 3 + ["buy followers now at cheapfollows dot com 2", "great video!!!"]
+    unique_texts, inverse, counts = deduplicate(texts, near_threshold=0.7)
+    assert unique_texts == ["great video", "buy followers now at cheapfollows dot com 1"]
+    assert inverse.tolist() == [0, 1, 1, 1, 1, 0]
+    assert counts.tolist() == [2, 4]
+
+    exact_only, _, exact_counts = deduplicate(texts, near_threshold=0)
+    assert len(exact_only) == 4
+    assert exact_counts.sum() == len(texts)
+
+
+def test_batch_normalization_matches_per_row():
+    texts = [
+        "  Part 2??  ", "ＦＵＬＬ　ｗｉｄｔｈ!!", "🔥🔥🔥 fire", "ΟΔΟΣ", "", " ", "a\x00b", "tab\tand\nline",
+        "e\u0301 combining", "ﬁne  ½", "__init__", "...--", "\x1cx\x1f", 42, None
+    ]
+    assert normalize_texts(texts) == [normalize_text(t) for t in texts]
+    assert normalize_texts(texts[:1]) == ["part 2?"]
+
+
+def test_shingles_line_up_with_their_documents():
+    texts = ["abcdef", "", "abc", "été 🔥", "wxyz", "a\0bcde"]
+    shingles, counts = _shingles(texts)
+
+    expected = []
+    for text in texts:
+        data = text.replace("\0", " ").encode("utf-8")
+        expected.append([int.from_bytes(data[i:i + 4], "little") for i in range(len(data) - 3)])
+    assert counts.tolist() == [len(e) for e in expected]
+    assert shingles.tolist() == [s for e in expected for s in e]
@@ -0,0 +1,32 @@
+import tracemalloc
+
+import numpy as np
+from sklearn.datasets import make_blobs
+from sklearn.metrics import adjusted_rand_score
+
+from intelligence.clustering.clusterer import cluster_embeddings
+from intelligence.embeddings.quantize import quantize
+
+
+def test_memory_cap_bounds_peak_allocation(tmp_path):
+    X, y = make_blobs(60000, n_features=64, centers=5, random_state=0)
+    matrix = np.lib.format.open_memmap(str(tmp_path / "m.npy"), mode="w+", dtype=np.float32, shape=X.shape)
+    matrix[:] = X
+    cap = 4 * 1024 * 1024
+
+    tracemalloc.start()
+    labels = cluster_embeddings(matrix, n_clusters=5, memory_cap=cap)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # The cap covers the working set; the label vector itself is extra.
+    assert peak < cap + labels.nbytes * 2
+    assert adjusted_rand_score(y, labels) > 0.99
+    assert adjusted_rand_score(y, cluster_embeddings(quantize(X, "int8"), n_clusters=5, memory_cap=cap)) > 0.99
+
+
+def test_large_clusters_are_split():
+    X, _ = make_blobs(4000, n_features=8, centers=2, random_state=1)
+    labels = cluster_embeddings(X.astype(np.float32), n_clusters=2, split_share=0.3, subclusters=3)
+    assert len(np.unique(labels)) == 6
+    assert labels.max() == 5
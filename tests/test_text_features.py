@@ -0,0 +1,51 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from intelligence.text_features import text_features, cluster_keywords, POS_WORDS, NEG_WORDS
+
+
+def _reference_sentiment(text):
+    # The per-row scorer text_features replaced.
+    tokens = re.findall(r"[a-zA-Z']+", str(text).lower())
+    pos = sum(1 for t in tokens if t in POS_WORDS)
+    neg = sum(1 for t in tokens if t in NEG_WORDS)
+    return (pos - neg) / (pos + neg) if pos + neg else 0.0
+
+
+def test_matches_per_row_scores():
+    rng = np.random.default_rng(0)
+    alphabet = list("abdeghklnorstuyz' \t\nK") + ["good", "bad", "hate", "LOVE", "é", "　", "K"]
+    texts = ["".join(rng.choice(alphabet, size=rng.integers(0, 30))) for _ in range(3000)]
+    texts += [np.nan, None, "", "Thanks!! super helpful", "not\x00good", "good'", "awesomeawesome", 7]
+    comments = pd.Series(texts * 2, dtype=object)
+
+    word_counts, sentiment = text_features(comments, negation=False)
+
+    assert np.array_equal(word_counts, [float(len(str(t).split())) for t in comments])
+    assert np.array_equal(sentiment, [_reference_sentiment(t) for t in comments])
+
+
+def test_negation_flips_the_next_lexicon_word():
+    texts = ["not good", "I don't hate it", "Never boring, always great", "good, not", "not", "no\ngood"]
+
+    _, sentiment = text_features(texts, negation=True)
+
+    assert list(sentiment) == [-1.0, 1.0, 1.0, 1.0, 0.0, -1.0]
+    assert list(text_features(texts, negation=False)[1]) == [1.0, -1.0, 0.0, 1.0, 0.0, 1.0]
+
+
+def test_cluster_keywords_favour_distinctive_terms():
+    texts = ["great video about pricing", "pricing is too high", "video pricing again"] * 3
+    texts += ["great video, audio is off", "audio quality please", "the video audio lags"] * 2
+    texts += ["the and of"]
+    labels = [7] * 9 + [2] * 6 + [5]
+
+    keywords = cluster_keywords(pd.Series(texts), np.array(labels), top_n=3)
+
+    assert set(keywords) == {"2", "5", "7"}
+    assert keywords["7"][0] == {"keyword": "pricing", "importance": keywords["7"][0]["importance"], "count": 9}
+    assert keywords["2"][0]["keyword"] == "audio" and keywords["2"][0]["count"] == 6
+    assert keywords["5"] == []
+    assert len(keywords["7"]) == 3
@@ -5,5 +5,9 @@ def text_hash(text: str) -> str:
     return hashlib.md5(text.encode("utf-8")).hexdigest()
 
 
+def namespaced_hash(namespace: str, text: str) -> str:
+    return hashlib.md5(f"{namespace}\n{text}".encode("utf-8")).hexdigest()
+
+
 def dataset_hash(df) -> str:
     return hashlib.md5(df.to_csv(index=False).encode()).hexdigest()
@@ -0,0 +1,17 @@
+import threading
+
+import redis
+
+from config.settings import REDIS_URL
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_redis(url=REDIS_URL):
+    # One client, and so one connection pool, per process and URL. redis-py
+    # pools are thread-safe and reset themselves in a forked child.
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = redis.Redis.from_url(url)
+        return _clients[url]
@@ -3,18 +3,14 @@ import sys
 import json
 import pickle
 import pandas as pd
-import redis
 
 ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
 if ROOT_DIR not in sys.path:
     sys.path.append(ROOT_DIR)
 
-from config.settings import STORAGE_RAW_DIR, REDIS_URL
+from config.settings import STORAGE_RAW_DIR
 from pipelines.process_comments import process_comments
-
-
-def get_redis():
-    return redis.Redis.from_url(REDIS_URL)
+from utils.redis_client import get_redis
 
 
 def run_worker():
@@ -29,7 +25,13 @@ def run_worker():
             r.set(f"job:{job_id}", json.dumps({"status": "processing", "progress": 0.05}))
             path = os.path.join(STORAGE_RAW_DIR, f"{dataset_id}.csv")
             df = pd.read_csv(path)
-            process_comments(df, job_id=job_id, dataset_id=dataset_id)
+            process_comments(
+                df,
+                job_id=job_id,
+                dataset_id=dataset_id,
+                creator_id=job.get("creator_id"),
+                video_id=job.get("video_id")
+            )
         except Exception as exc:
             r.set(f"job:{job_id}", json.dumps({"status": "failed", "progress": 1.0, "error": str(exc)}))
 